@@ -0,0 +1,557 @@
+import os
+import sys
+import json
+import math
+import time
+import socket
+import threading
+from functools import reduce
+from operator import xor
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+# --- CONFIGURATION ---
+# CHARTPLOTTER_AIS: udp:<port> | tcp:<host>:<port> | replay:<file>[@speed] | off
+AIS_SOURCE = "udp:10110"
+AIS_PORT = 8002
+TARGET_TTL = 360          # Seconds without a report before a target is dropped (class A at anchor: 3 min)
+STATIC_TTL = 1800         # Names/callsigns (type 5/24, sent every 6 min) are kept this long after the last one
+CPA_ALARM_NM = 0.5        # Alarm when the closest approach is under this...
+TCPA_ALARM_MIN = 12       # ...and happens within this many minutes
+MAX_RENDER = 500          # Markers sent to the map per refresh (closest first)
+MIN_FIX_INTERVAL = 1.0    # Own fixes closer together than this (seconds) don't update SOG/COG
+RECONNECT = 5             # Seconds between TCP reconnect attempts
+REPLAY_LINES_PER_SEC = 50 # Replay pace for files without timestamps
+EARTH_NM_PER_DEG = 60.0
+MS_TO_KTS = 1.943844
+
+
+# --- 1. AIVDM DECODER ---
+SIXBIT_TEXT = "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_ !\"#$%&'()*+,-./0123456789:;<=>?"
+
+def _nmea_ok(line):
+    body, _, check = line[1:].partition("*")
+    try:
+        return reduce(xor, body.encode(), 0) == int(check[:2], 16)
+    except ValueError:
+        return False
+
+class _Bits:
+    # The payload as one big integer, fields pulled out by bit offset
+    def __init__(self, payload, fill):
+        value = 0
+        for ch in payload:
+            v = ord(ch) - 48
+            value = (value << 6) | (v - 8 if v > 40 else v)
+        self.value = value >> fill
+        self.n = len(payload) * 6 - fill
+
+    def u(self, start, length):
+        if start + length > self.n: return None
+        return (self.value >> (self.n - start - length)) & ((1 << length) - 1)
+
+    def s(self, start, length):
+        v = self.u(start, length)
+        if v is None: return None
+        return v - (1 << length) if v & (1 << (length - 1)) else v
+
+    def text(self, start, length):
+        chars = []
+        for i in range(start, start + length, 6):
+            v = self.u(i, 6)
+            if v is None: break
+            chars.append(SIXBIT_TEXT[v])
+        return "".join(chars).split("@")[0].strip()
+
+def _position(b, sog_at, lon_at, cog_at):
+    # -> dict or None when the position is "not available"
+    lon, lat = b.s(lon_at, 28), b.s(lon_at + 28, 27)
+    if lon is None or lat is None or lon == 181 * 600000 or lat == 91 * 600000: return None
+    sog, cog, hdg = b.u(sog_at, 10), b.u(cog_at, 12), b.u(cog_at + 12, 9)
+    return {
+        'mmsi': b.u(8, 30), 'lat': lat / 600000.0, 'lon': lon / 600000.0,
+        'sog': sog / 10.0 if sog is not None and sog != 1023 else float("nan"),
+        'cog': cog / 10.0 if cog is not None and cog < 3600 else float("nan"),
+        'heading': hdg if hdg is not None and hdg < 360 else None,
+    }
+
+def decode_payload(payload, fill=0):
+    # Message types that matter for traffic: 1/2/3 (class A), 18/19 (class B), 5/24 (names)
+    b = _Bits(payload, fill)
+    kind = b.u(0, 6)
+    if kind in (1, 2, 3): return _position(b, 50, 61, 116)
+    if kind in (18, 19):
+        fix = _position(b, 46, 57, 112)
+        if fix and kind == 19: fix.update(name=b.text(143, 120), ship_type=b.u(263, 8))
+        return fix
+    if kind == 5 and b.n >= 240:
+        return {'mmsi': b.u(8, 30), 'callsign': b.text(70, 42), 'name': b.text(112, 120), 'ship_type': b.u(232, 8)}
+    if kind == 24:
+        if b.u(38, 2) == 0: return {'mmsi': b.u(8, 30), 'name': b.text(40, 120)}
+        return {'mmsi': b.u(8, 30), 'ship_type': b.u(40, 8), 'callsign': b.text(90, 42)}
+    return None
+
+class AisDecoder:
+    # Feed raw lines (optionally with an NMEA 4.0 \c:<epoch>\ tag block) -> (report, timestamp or None).
+    # VDO sentences are our own transponder: those reports carry 'own': True
+    def __init__(self):
+        self.fragments = {}
+
+    def feed(self, line):
+        line = line.strip()
+        stamp = None
+        if line.startswith("\\"):
+            tags, _, line = line[1:].partition("\\")
+            for tag in tags.split("*")[0].split(","):
+                if tag.startswith("c:"):
+                    try:
+                        stamp = float(tag[2:])
+                        if stamp > 1e11: stamp /= 1000   # Some loggers write milliseconds
+                    except ValueError:
+                        pass
+        if len(line) < 15 or line[0] != "!" or line[3:6] not in ("VDM", "VDO") or not _nmea_ok(line): return None, stamp
+        f = line.split("*")[0].split(",")
+        if len(f) < 7: return None, stamp
+        try:
+            count, num, fill = int(f[1]), int(f[2]), int(f[6] or 0)
+        except ValueError:
+            return None, stamp
+
+        payload = f[5]
+        if count > 1:
+            key = (f[3], f[4])
+            parts = self.fragments.setdefault(key, {})
+            parts[num] = payload
+            if len(parts) < count:
+                if len(self.fragments) > 64: self.fragments = {key: parts}   # Lost fragments don't pile up
+                return None, stamp
+            del self.fragments[key]
+            payload = "".join(parts.get(i, "") for i in range(1, count + 1))
+        try:
+            report = decode_payload(payload, fill)
+        except (IndexError, ValueError):
+            return None, stamp
+        if report and line[3:6] == "VDO": report['own'] = True
+        return report, stamp
+
+
+# --- 2. TARGET TABLE ---
+class TargetTable:
+    # Column arrays (one row per vessel) so CPA/TCPA for every target is a single NumPy pass
+    def __init__(self, capacity=256):
+        self.lock = threading.Lock()
+        self.n = 0
+        self.index = {}          # mmsi -> row
+        self.info = {}           # mmsi -> {'name', 'callsign', 'ship_type'}
+        self.info_seen = {}      # mmsi -> time of the last static report
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = getattr(self, 'cols', None)
+        self.cols = {k: np.full(capacity, np.nan) for k in ('lat', 'lon', 'sog', 'cog', 'heading', 'seen')}
+        self.cols['mmsi'] = np.zeros(capacity, dtype=np.int64)
+        if old:
+            for k, v in old.items(): self.cols[k][:self.n] = v[:self.n]
+
+    def update(self, report, t):
+        mmsi = report['mmsi']
+        with self.lock:
+            static = {k: report[k] for k in ('name', 'callsign', 'ship_type') if report.get(k)}
+            if static:
+                self.info.setdefault(mmsi, {}).update(static)
+                self.info_seen[mmsi] = t
+            if 'lat' not in report: return
+            row = self.index.get(mmsi)
+            if row is None:
+                if self.n == len(self.cols['mmsi']): self._alloc(self.n * 2)
+                row = self.index[mmsi] = self.n
+                self.n += 1
+            c = self.cols
+            c['mmsi'][row] = mmsi
+            c['lat'][row], c['lon'][row] = report['lat'], report['lon']
+            c['sog'][row], c['cog'][row] = report['sog'], report['cog']
+            c['heading'][row] = np.nan if report['heading'] is None else report['heading']
+            c['seen'][row] = t
+
+    def evict(self, now, ttl=TARGET_TTL):
+        with self.lock:
+            # Statics age out on their own clock: they often arrive before the first position report
+            if self.info_seen and min(self.info_seen.values()) < now - STATIC_TTL:
+                stale = [m for m, t in self.info_seen.items() if t < now - STATIC_TTL and m not in self.index]
+                for m in stale:
+                    del self.info[m], self.info_seen[m]
+            keep = self.cols['seen'][:self.n] >= now - ttl
+            if keep.all(): return 0
+            dropped = self.n - int(keep.sum())
+            for k, v in self.cols.items():
+                live = v[:self.n][keep]
+                v[:len(live)] = live
+            self.n -= dropped
+            self.index = {int(m): i for i, m in enumerate(self.cols['mmsi'][:self.n])}
+            return dropped
+
+    def snapshot(self):
+        with self.lock:
+            snap = {k: v[:self.n].copy() for k, v in self.cols.items()}
+            snap['info'] = {m: dict(v) for m, v in self.info.items()}
+        return snap
+
+
+class OwnShip:
+    # One boat: each app session keeps its own (st.session_state), fed by that session's GPS fixes.
+    # Without a speed/heading from the fix, SOG/COG come from successive fixes, so no route is needed.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None        # (lat, lon, sog, cog, t)
+        self.prev = None         # Last fix used for the SOG/COG estimate
+
+    def fix(self, lat, lon, t=None, sog=None, cog=None):
+        t = time.time() if t is None else t
+        with self.lock:
+            if sog is None or cog is None:
+                sog, cog = 0.0, 0.0
+                if self.prev is not None:
+                    plat, plon, pt = self.prev
+                    dt = t - pt
+                    if dt < MIN_FIX_INTERVAL:
+                        # Too close to the last fix to measure: keep the previous estimate
+                        sog, cog = self.state[2], self.state[3]
+                    elif dt <= TARGET_TTL:
+                        dx = (lon - plon) * EARTH_NM_PER_DEG * math.cos(math.radians(lat))
+                        dy = (lat - plat) * EARTH_NM_PER_DEG
+                        sog, cog = math.hypot(dx, dy) / (dt / 3600), math.degrees(math.atan2(dx, dy)) % 360
+            if self.prev is None or t - self.prev[2] >= MIN_FIX_INTERVAL: self.prev = (lat, lon, t)
+            self.state = (lat, lon, float(sog), float(cog), t)
+
+    def seed(self, lat, lon):
+        # Position to use until the first real fix arrives (stationary)
+        with self.lock:
+            if self.state is None: self.state = (lat, lon, 0.0, 0.0, time.time())
+
+    def at(self, now=None):
+        # -> (lat, lon, sog, cog) dead-reckoned to `now`, None before any fix
+        with self.lock: state = self.state
+        if state is None: return None
+        lat, lon, sog, cog, t = state
+        now = time.time() if now is None else now
+        dlat, dlon = _dead_reckon(lat, sog, cog, np.clip(now - t, 0, TARGET_TTL))
+        return float(lat + dlat), float(lon + dlon), sog, cog
+
+
+# --- 3. COLLISION MATHS ---
+def _has_vector(sog, cog):
+    # Both SOG and COG reported. A target without COG has no usable velocity: never assume north.
+    return ~np.isnan(sog) & ~np.isnan(cog)
+
+def _dead_reckon(lat, sog, cog, age_s):
+    # Degrees moved in `age_s` seconds on sog/cog (no vector = stays put)
+    moving = _has_vector(sog, cog)
+    sog, cog = np.where(moving, sog, 0.0), np.radians(np.where(moving, cog, 0.0))
+    nm = sog * age_s / 3600
+    return nm * np.cos(cog) / EARTH_NM_PER_DEG, nm * np.sin(cog) / (EARTH_NM_PER_DEG * np.cos(np.radians(lat)))
+
+def cpa_tcpa(own, lat, lon, sog, cog):
+    # own: (lat, lon, sog kts, cog deg). Local flat projection around our boat (fine inside AIS range).
+    # -> range nm, cpa nm, tcpa minutes (negative = already passed), all arrays
+    olat, olon, osog, ocog = own
+    kx = EARTH_NM_PER_DEG * np.cos(np.radians(olat))
+    rx, ry = (lon - olon) * kx, (lat - olat) * EARTH_NM_PER_DEG
+    moving = _has_vector(sog, cog)
+    sog, cog = np.where(moving, sog, 0.0), np.radians(np.where(moving, cog, 0.0))
+    vx = sog * np.sin(cog) - osog * np.sin(np.radians(ocog))
+    vy = sog * np.cos(cog) - osog * np.cos(np.radians(ocog))
+    v2 = vx ** 2 + vy ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(v2 > 1e-9, -(rx * vx + ry * vy) / v2, 0.0)
+    return np.hypot(rx, ry), np.hypot(rx + vx * t, ry + vy * t), t * 60
+
+def assess(snap, own, now=None, cpa_nm=CPA_ALARM_NM, tcpa_min=TCPA_ALARM_MIN):
+    # Dead-reckons every target *and* our own boat (OwnShip or a (lat, lon, sog, cog) tuple) to `now`,
+    # then CPA/TCPA + alarm flags for all of them at once. No own position yet = no CPA, no alarms.
+    now = time.time() if now is None else now
+    dlat, dlon = _dead_reckon(snap['lat'], snap['sog'], snap['cog'], np.clip(now - snap['seen'], 0, TARGET_TTL))
+    lat, lon = snap['lat'] + dlat, snap['lon'] + dlon
+    if isinstance(own, OwnShip): own = own.at(now)
+    if own is None:
+        nan = np.full(len(lat), np.nan)
+        return dict(snap, lat=lat, lon=lon, range=nan, cpa=nan, tcpa=nan, alarm=np.zeros(len(lat), dtype=bool))
+    rng, cpa, tcpa = cpa_tcpa(own, lat, lon, snap['sog'], snap['cog'])
+    # Targets without a SOG/COG vector get a CPA as if stationary but never raise an alarm
+    alarm = (cpa < cpa_nm) & (tcpa >= 0) & (tcpa <= tcpa_min) & _has_vector(snap['sog'], snap['cog'])
+    return dict(snap, lat=lat, lon=lon, range=rng, cpa=cpa, tcpa=tcpa, alarm=alarm)
+
+def alarm_list(state):
+    # Alarmed targets, soonest first -> [{'mmsi', 'name', 'cpa', 'tcpa', 'range'}]
+    rows = np.flatnonzero(state['alarm'])
+    rows = rows[np.argsort(state['tcpa'][rows])]
+    return [{'mmsi': int(state['mmsi'][i]), 'name': state['info'].get(int(state['mmsi'][i]), {}).get('name', ""),
+             'cpa': float(state['cpa'][i]), 'tcpa': float(state['tcpa'][i]), 'range': float(state['range'][i])}
+            for i in rows]
+
+
+# --- 4. FEEDS (UDP / TCP / replay) ---
+class AisFeed:
+    def __init__(self, source=AIS_SOURCE):
+        self.source = source
+        self.table = TargetTable()
+        # AIVDO from a transponder on this feed. Whose boat that is depends on the install, so only the
+        # CLI below uses it; app sessions send their own position with every /ais poll instead.
+        self.transponder = OwnShip()
+        self.decoder = AisDecoder()
+        self.messages = 0
+        self.status = "starting"
+
+    def _ingest(self, report, t):
+        if not report or not report.get('mmsi'): return
+        if report.get('own'):
+            if 'lat' in report:
+                sog, cog = report['sog'], report['cog']
+                self.transponder.fix(report['lat'], report['lon'], t, None if math.isnan(sog) else sog, None if math.isnan(cog) else cog)
+        else:
+            self.table.update(report, t)
+        self.messages += 1
+
+    def feed_line(self, line, now=None):
+        report, stamp = self.decoder.feed(line)
+        self._ingest(report, stamp or (time.time() if now is None else now))
+
+    def _feed_block(self, data):
+        for line in data.decode("ascii", errors="ignore").splitlines():
+            self.feed_line(line)
+
+    def _read_udp(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', port))
+        sock.settimeout(1.0)
+        self.status = f"listening on UDP {port}"
+        while True:
+            try:
+                self._feed_block(sock.recv(65535))
+            except socket.timeout:
+                pass
+            self.table.evict(time.time())
+
+    def _read_tcp(self, host, port):
+        while True:
+            try:
+                with socket.create_connection((host, port), timeout=30) as sock:
+                    self.status = f"connected to {host}:{port}"
+                    buf = b""
+                    while True:
+                        chunk = sock.recv(65535)
+                        if not chunk: break
+                        buf += chunk
+                        lines, _, buf = buf.rpartition(b"\n")
+                        self._feed_block(lines)
+                        self.table.evict(time.time())
+            except OSError as e:
+                self.status = f"TCP {host}:{port} down ({e}), retrying"
+            time.sleep(RECONNECT)
+
+    def _read_replay(self, path, speed=1.0):
+        # Loops the file. Tag-block timestamps set the pace (scaled by speed) and are shifted to
+        # "now" so TTL/dead reckoning behave like a live feed.
+        while True:
+            self.status = f"replaying {os.path.basename(path)}"
+            offset, started = None, time.time()
+            with open(path, encoding="ascii", errors="ignore") as f:
+                for line in f:
+                    report, stamp = self.decoder.feed(line)
+                    if stamp is not None:
+                        if offset is None: offset = stamp
+                        wait = (stamp - offset) / speed - (time.time() - started)
+                        if wait > 0: time.sleep(min(wait, 60))
+                    else:
+                        time.sleep(1.0 / REPLAY_LINES_PER_SEC)
+                    self._ingest(report, time.time())
+                    self.table.evict(time.time())
+
+    def run(self):
+        kind, _, arg = self.source.partition(":")
+        try:
+            if kind == "udp": self._read_udp(int(arg))
+            elif kind == "tcp":
+                host, _, port = arg.rpartition(":")
+                self._read_tcp(host, int(port))
+            elif kind == "replay":
+                path, _, speed = arg.partition("@")
+                self._read_replay(path, float(speed or 1))
+            else:
+                self.status = f"unknown source '{self.source}'"
+        except (OSError, ValueError) as e:
+            self.status = f"stopped: {e}"
+            print(f"AIS feed error: {e}")
+
+def open_feed(source=None):
+    # None when AIS is switched off
+    source = source or os.environ.get("CHARTPLOTTER_AIS", AIS_SOURCE)
+    if source == "off": return None
+    feed = AisFeed(source)
+    threading.Thread(target=feed.run, daemon=True).start()
+    return feed
+
+
+# --- 5. MAP ENDPOINT ---
+def start_ais_server(feed, port=AIS_PORT):
+    # GET /ais?s=&w=&n=&e=&cpa=&tcpa=[&lat=&lon=&sog=&cog=&t=] -> targets in view (+ every alarmed one).
+    # CPA is against the caller's own fix (dead-reckoned from t to now); without lat/lon there is no CPA.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/ais":
+                self.send_error(404)
+                return
+            q = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                def num(k, d):
+                    v = float(q.get(k, d))
+                    if not math.isfinite(v): raise ValueError(k)
+                    return v
+                own = None
+                if 'lat' in q and 'lon' in q:
+                    own = OwnShip()
+                    own.fix(num('lat', 0), num('lon', 0), num('t', time.time()), num('sog', 0), num('cog', 0))
+                state = assess(feed.table.snapshot(), own, cpa_nm=num('cpa', CPA_ALARM_NM), tcpa_min=num('tcpa', TCPA_ALARM_MIN))
+                in_view = ((state['lat'] >= num('s', -90)) & (state['lat'] <= num('n', 90)) &
+                           (state['lon'] >= num('w', -180)) & (state['lon'] <= num('e', 180)))
+            except ValueError:
+                self.send_error(400)
+                return
+            rows = np.flatnonzero(in_view | state['alarm'])
+            rows = rows[np.argsort(state['range'][rows])][:MAX_RENDER]
+
+            info = state['info']
+            r = lambda a, i, d=1: None if not np.isfinite(a[i]) else round(float(a[i]), d)
+            targets = [{'mmsi': int(state['mmsi'][i]), 'name': info.get(int(state['mmsi'][i]), {}).get('name', ""),
+                        'lat': round(float(state['lat'][i]), 6), 'lon': round(float(state['lon'][i]), 6),
+                        'sog': r(state['sog'], i), 'cog': r(state['cog'], i), 'hdg': r(state['heading'], i, 0),
+                        'cpa': r(state['cpa'], i, 2), 'tcpa': r(state['tcpa'], i), 'range': r(state['range'], i, 2),
+                        'alarm': bool(state['alarm'][i])} for i in rows]
+            body = json.dumps({'total': len(state['mmsi']), 'alarms': int(state['alarm'].sum()),
+                               'status': feed.status, 'targets': targets}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    try:
+        server = Server(('0.0.0.0', port), Handler)
+    except OSError:
+        # Another worker already serves the targets
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class AisLayer(MacroElement):
+    # Polls /ais once a second with the current map bounds and moves the target markers in place
+    # (no Streamlit rerun). Red = CPA/TCPA alarm; the line is the 6-minute course vector.
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var targets = {};
+            var busy = false;
+            var banner = L.control({position: 'bottomright'});
+            banner.onAdd = function() {
+                this._div = L.DomUtil.create('div');
+                this._div.style.cssText = 'background:#c00;color:white;padding:4px 8px;border-radius:4px;font-family:sans-serif;display:none';
+                return this._div;
+            };
+            banner.addTo(map);
+
+            function vectorEnd(t) {
+                if (t.sog === null || t.cog === null) return [t.lat, t.lon];
+                var nm = t.sog / 10, rad = t.cog * Math.PI / 180;
+                return [t.lat + nm * Math.cos(rad) / 60, t.lon + nm * Math.sin(rad) / (60 * Math.cos(t.lat * Math.PI / 180))];
+            }
+
+            // Vessel names come off the radio (untrusted): text nodes only, never innerHTML
+            function textLines(lines, boldFirst) {
+                var el = document.createElement('div');
+                lines.forEach(function(line, i) {
+                    if (i) el.appendChild(document.createElement('br'));
+                    var node = i === 0 && boldFirst ? document.createElement('b') : document.createTextNode('');
+                    node.textContent = line;
+                    el.appendChild(node);
+                });
+                return el;
+            }
+
+            function refresh() {
+                if (busy) return;
+                busy = true;
+                var b = map.getBounds().pad(0.2);
+                var url = window.location.protocol + '//' + window.location.hostname + ':{{ this.port }}/ais'
+                    + '?s=' + b.getSouth() + '&w=' + b.getWest() + '&n=' + b.getNorth() + '&e=' + b.getEast()
+                    + '&cpa={{ this.cpa_nm }}&tcpa={{ this.tcpa_min }}{{ this.own }}';
+                fetch(url).then(function(r) { return r.json(); }).then(function(d) {
+                    var seen = {};
+                    var alarms = [];
+                    d.targets.forEach(function(t) {
+                        seen[t.mmsi] = true;
+                        var color = t.alarm ? '#d00000' : '#00897b';
+                        var label = textLines([String(t.name || t.mmsi), 'SOG ' + t.sog + ' kts · COG ' + t.cog + '°',
+                                               'CPA ' + t.cpa + ' nm in ' + t.tcpa + ' min'], true);
+                        var m = targets[t.mmsi];
+                        if (m) {
+                            m.dot.setLatLng([t.lat, t.lon]).setStyle({color: color});
+                            m.vec.setLatLngs([[t.lat, t.lon], vectorEnd(t)]).setStyle({color: color});
+                        } else {
+                            m = targets[t.mmsi] = {
+                                dot: L.circleMarker([t.lat, t.lon], {radius: 6, color: color, weight: 2, fillOpacity: 0.6}).addTo(map),
+                                vec: L.polyline([[t.lat, t.lon], vectorEnd(t)], {color: color, weight: 2}).addTo(map)
+                            };
+                        }
+                        m.dot.bindTooltip(label);
+                        if (t.alarm) alarms.push('⚠️ ' + (t.name || t.mmsi) + ' CPA ' + t.cpa + ' nm / ' + t.tcpa + ' min');
+                    });
+                    Object.keys(targets).forEach(function(k) {
+                        if (!seen[k]) { map.removeLayer(targets[k].dot); map.removeLayer(targets[k].vec); delete targets[k]; }
+                    });
+                    banner._div.replaceChildren(textLines(alarms));
+                    banner._div.style.display = alarms.length ? 'block' : 'none';
+                }).catch(function() {}).then(function() { busy = false; });
+            }
+            refresh();
+            setInterval(refresh, 1000);
+            map.on('moveend', refresh);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, cpa_nm=CPA_ALARM_NM, tcpa_min=TCPA_ALARM_MIN, port=AIS_PORT, own=None):
+        # own: this session's OwnShip. Its last fix rides along on every poll (the map re-renders on each new fix).
+        super().__init__()
+        self._name = "AisLayer"
+        self.cpa_nm = cpa_nm
+        self.tcpa_min = tcpa_min
+        self.port = port
+        state = own.state if own is not None else None
+        self.own = "" if state is None else "&" + urlencode(dict(zip(("lat", "lon", "sog", "cog", "t"), state)))
+
+
+if __name__ == "__main__":
+    # python ais.py [source]   e.g. udp:10110 | tcp:192.168.1.20:10110 | replay:harbor.nmea@10
+    # Prints the target count and any CPA alarms every second (own boat from AIVDO, else stationary at the default position)
+    feed = open_feed(sys.argv[1] if len(sys.argv) > 1 else None)
+    if feed: feed.transponder.seed(29.55, -94.90)
+    while feed:
+        time.sleep(1)
+        state = assess(feed.table.snapshot(), feed.transponder)
+        print(f"📡 {feed.status}: {len(state['mmsi'])} targets, {feed.messages} reports")
+        for a in alarm_list(state):
+            print(f"  ⚠️ {a['name'] or a['mmsi']}: CPA {a['cpa']:.2f} nm in {a['tcpa']:.1f} min ({a['range']:.2f} nm away)")
@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import heapq
+import hashlib
+import numpy as np
+
+# --- CONFIGURATION ---
+# Galveston Bay Area [South, West, North, East]
+bbox = [29.2000, -95.0500, 29.7000, -94.6000]
+
+# Obstacles: land / shoal polygons (GeoJSON), or a ready-made boolean water mask (.npy, True = water)
+COASTLINE_FILE = "data/coastline.geojson"
+WATER_MASK_FILE = "data/water_mask.npy"
+CACHE_DIR = "data/cache"
+
+CELL_M = 150              # Grid resolution (meters)
+MIN_DEPTH_M = 1.5         # Depth areas shallower than this count as land
+MAX_CLEARANCE = 4         # Cells of shoreline buffer the distance transform looks at
+SHORE_PENALTY = 0.5       # Extra cost per nm for hugging the shore (0 = shortest path)
+SNAP_RADIUS = 10          # Cells to search for water when a click lands on land
+
+EARTH_RADIUS_NM = 3440.065
+# 8-connected moves (dy, dx)
+MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+# --- 1. NAVIGABLE-WATER GRID ---
+class NavGrid:
+    def __init__(self, water, clearance, bbox):
+        self.water = water            # (H, W) bool, row 0 = north edge
+        self.clearance = clearance    # (H, W) uint8, cells to the nearest land (capped at MAX_CLEARANCE)
+        self.bbox = bbox
+        self.h, self.w = water.shape
+        self.dlat = (bbox[2] - bbox[0]) / self.h
+        self.dlon = (bbox[3] - bbox[1]) / self.w
+
+    def to_cell(self, lat, lon):
+        r = int((self.bbox[2] - lat) / self.dlat)
+        c = int((lon - self.bbox[1]) / self.dlon)
+        return min(max(r, 0), self.h - 1), min(max(c, 0), self.w - 1)
+
+    def to_latlon(self, r, c):
+        return float(self.bbox[2] - (r + 0.5) * self.dlat), float(self.bbox[1] + (c + 0.5) * self.dlon)
+
+    def snap(self, r, c):
+        # Nearest water cell (by grid distance) within SNAP_RADIUS
+        r0, r1 = max(r - SNAP_RADIUS, 0), min(r + SNAP_RADIUS + 1, self.h)
+        c0, c1 = max(c - SNAP_RADIUS, 0), min(c + SNAP_RADIUS + 1, self.w)
+        rr, cc = np.nonzero(self.water[r0:r1, c0:c1])
+        if len(rr) == 0: return None
+        i = np.argmin((rr + r0 - r) ** 2 + (cc + c0 - c) ** 2)
+        return int(rr[i] + r0), int(cc[i] + c0)
+
+    def line_is_clear(self, a, b):
+        # Sample the straight line between two cells at half-cell spacing
+        n = int(max(abs(b[0] - a[0]), abs(b[1] - a[1])) * 2) + 1
+        rs = np.rint(np.linspace(a[0], b[0], n + 1)).astype(int)
+        cs = np.rint(np.linspace(a[1], b[1], n + 1)).astype(int)
+        return bool(self.water[rs, cs].all())
+
+
+def _grid_shape(bbox, cell_m=CELL_M):
+    mid_lat = math.radians((bbox[0] + bbox[2]) / 2)
+    h = int(math.ceil((bbox[2] - bbox[0]) * 111320 / cell_m))
+    w = int(math.ceil((bbox[3] - bbox[1]) * 111320 * math.cos(mid_lat) / cell_m))
+    return h, w
+
+
+def _rasterize_geojson(path, bbox, shape):
+    # Even-odd scanline fill of every obstacle polygon onto the grid -> blocked mask
+    h, w = shape
+    lats = bbox[2] - (np.arange(h) + 0.5) * (bbox[2] - bbox[0]) / h
+    lons = bbox[1] + (np.arange(w) + 0.5) * (bbox[3] - bbox[1]) / w
+    blocked = np.zeros(shape, dtype=bool)
+
+    with open(path) as f:
+        features = json.load(f).get('features', [])
+
+    for feat in features:
+        geom = feat.get('geometry') or {}
+        props = feat.get('properties') or {}
+        depth = props.get('depth', props.get('DRVAL1'))
+        # Depth areas deep enough for us are water, everything else is an obstacle
+        if depth is not None and float(depth) >= MIN_DEPTH_M: continue
+
+        if geom.get('type') == 'Polygon': polygons = [geom['coordinates']]
+        elif geom.get('type') == 'MultiPolygon': polygons = geom['coordinates']
+        else: continue
+
+        for rings in polygons:
+            inside = np.zeros(shape, dtype=bool)
+            for ring in rings:
+                pts = np.asarray(ring, dtype=float)
+                x0, y0 = pts[:-1, 0], pts[:-1, 1]
+                x1, y1 = pts[1:, 0], pts[1:, 1]
+                rows = np.nonzero((lats >= y0.min() - 1e-9) & (lats <= y0.max() + 1e-9))[0]
+                for r in rows:
+                    y = lats[r]
+                    cross = (y0 <= y) != (y1 <= y)
+                    if not cross.any(): continue
+                    xs = x0[cross] + (y - y0[cross]) * (x1[cross] - x0[cross]) / (y1[cross] - y0[cross])
+                    # Odd number of crossings to the left = inside
+                    inside[r] ^= (np.searchsorted(np.sort(xs), lons) & 1).astype(bool)
+            blocked |= inside
+    return blocked
+
+
+def _clearance(water):
+    # Chessboard distance transform (capped) by repeated 8-neighbour dilation of the land mask
+    clearance = np.full(water.shape, MAX_CLEARANCE, dtype=np.uint8)
+    reached = ~water
+    clearance[reached] = 0
+    for d in range(1, MAX_CLEARANCE):
+        grown = reached.copy()
+        grown[1:, :] |= reached[:-1, :]
+        grown[:-1, :] |= reached[1:, :]
+        grown[:, 1:] |= grown[:, :-1].copy()
+        grown[:, :-1] |= grown[:, 1:].copy()
+        clearance[grown & ~reached] = d
+        reached = grown
+    return clearance
+
+
+def build_nav_grid(source, bbox=bbox, cell_m=CELL_M):
+    shape = _grid_shape(bbox, cell_m)
+    if source.endswith(".npy"):
+        # Water mask is assumed to already cover the bbox; nearest-neighbour resample to our grid
+        mask = np.load(source).astype(bool)
+        ri = (np.arange(shape[0]) * mask.shape[0] / shape[0]).astype(int)
+        ci = (np.arange(shape[1]) * mask.shape[1] / shape[1]).astype(int)
+        water = mask[ri][:, ci]
+    else:
+        water = ~_rasterize_geojson(source, bbox, shape)
+    return NavGrid(water, _clearance(water), bbox)
+
+
+def load_nav_grid(source=None, bbox=bbox, cell_m=CELL_M, cache_dir=CACHE_DIR):
+    # Build the grid once per region/source and keep it as a packed bitmap on disk
+    if source is None:
+        source = COASTLINE_FILE if os.path.exists(COASTLINE_FILE) else WATER_MASK_FILE
+    stat = os.stat(source)
+    key = f"{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}|{bbox}|{cell_m}|{MIN_DEPTH_M}|{MAX_CLEARANCE}"
+    cache_file = os.path.join(cache_dir, f"navgrid_{hashlib.md5(key.encode()).hexdigest()[:12]}.npz")
+
+    if os.path.exists(cache_file):
+        data = np.load(cache_file)
+        shape = tuple(data['shape'])
+        water = np.unpackbits(data['water'], count=shape[0] * shape[1]).reshape(shape).astype(bool)
+        return NavGrid(water, data['clearance'], list(data['bbox']))
+
+    grid = build_nav_grid(source, bbox, cell_m)
+    if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+    np.savez_compressed(cache_file, water=np.packbits(grid.water), clearance=grid.clearance,
+                        shape=np.array(grid.water.shape), bbox=np.array(bbox))
+    return grid
+
+
+# --- 2. ROUTING ---
+def _haversine_nm(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def find_route(grid, start, end):
+    # A* over the water grid between two (lat, lon) points.
+    # Returns a simplified [(lat, lon), ...] path or None if no water route exists.
+    s = grid.snap(*grid.to_cell(*start))
+    g = grid.snap(*grid.to_cell(*end))
+    if s is None or g is None: return None
+
+    h, w = grid.h, grid.w
+    water = grid.water.ravel().tolist()
+    clear = grid.clearance.ravel().tolist()
+    goal = g[0] * w + g[1]
+    goal_lat, goal_lon = grid.to_latlon(*g)
+
+    # Step length per row (depends only on latitude), in nm
+    row_lat = [grid.to_latlon(r, 0)[0] for r in range(h)]
+    ns_nm = grid.dlat * 60
+    row_steps = []
+    for r in range(h):
+        ew_nm = grid.dlon * 60 * math.cos(math.radians(row_lat[r]))
+        row_steps.append([math.hypot(dy * ns_nm, dx * ew_nm) for dy, dx in MOVES])
+
+    def heuristic(r, c):
+        lat, lon = row_lat[r], grid.bbox[1] + (c + 0.5) * grid.dlon
+        return _haversine_nm(lat, lon, goal_lat, goal_lon)
+
+    start_idx = s[0] * w + s[1]
+    best = {start_idx: 0.0}
+    parent = {start_idx: -1}
+    open_heap = [(heuristic(*s), 0.0, start_idx)]
+    closed = set()
+
+    while open_heap:
+        _, cost, idx = heapq.heappop(open_heap)
+        if idx == goal: break
+        if idx in closed: continue
+        closed.add(idx)
+        r, c = divmod(idx, w)
+        steps = row_steps[r]
+        for k, (dy, dx) in enumerate(MOVES):
+            nr, nc = r + dy, c + dx
+            if nr < 0 or nr >= h or nc < 0 or nc >= w: continue
+            n = nr * w + nc
+            if not water[n] or n in closed: continue
+            # No cutting corners across land on diagonal moves
+            if dy and dx and not (water[r * w + nc] and water[nr * w + c]): continue
+            step = steps[k] * (1 + SHORE_PENALTY * (MAX_CLEARANCE - clear[n]) / MAX_CLEARANCE)
+            new_cost = cost + step
+            if new_cost < best.get(n, math.inf):
+                best[n] = new_cost
+                parent[n] = idx
+                heapq.heappush(open_heap, (new_cost + heuristic(nr, nc), new_cost, n))
+    else:
+        return None
+
+    cells = []
+    idx = goal
+    while idx != -1:
+        cells.append(divmod(idx, w))
+        idx = parent[idx]
+    cells.reverse()
+
+    path = [grid.to_latlon(*cell) for cell in simplify_cells(grid, cells)]
+    if len(path) == 1: path = path * 2
+    # The exact clicks are only kept when they are in water themselves; a click on land would put
+    # the first/last leg across the shore, so those legs start/end at the snapped cell instead
+    if grid.to_cell(*start) == s: path[0] = tuple(start)
+    if grid.to_cell(*end) == g: path[-1] = tuple(end)
+    return path
+
+
+def simplify_cells(grid, cells):
+    # String-pulling: from each kept cell jump to the farthest cell still in clear line of sight
+    if len(cells) <= 2: return cells
+    kept = [cells[0]]
+    i = 0
+    while i < len(cells) - 1:
+        j = len(cells) - 1
+        while j > i + 1 and not grid.line_is_clear(cells[i], cells[j]):
+            j = (i + 1 + j) // 2 if j - i > 8 else j - 1
+        kept.append(cells[j])
+        i = j
+    return kept
+
+
+def route_to_feature(path):
+    # Same GeoJSON shape as the Draw plugin so auto routes live alongside hand-drawn ones
+    return {
+        "type": "Feature",
+        "properties": {"auto": True},
+        "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in path]},
+    }
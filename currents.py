@@ -0,0 +1,213 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+# --- CONFIGURATION ---
+# Gridded tidal current field for the bay.
+# CSV layout: time (ISO or epoch seconds), lat, lon, u, v   (u = east, v = north, in knots)
+# NetCDF layout: time, lat/latitude, lon/longitude, u/water_u, v/water_v   (needs netCDF4)
+CURRENT_GRID = "data/currents.csv"
+CACHE_DIR = "data/cache"
+
+EARTH_RADIUS_NM = 3440.065
+MS_TO_KTS = 1.943844
+GRID_TIME_RANGE = (631152000, 4102444800)   # 1990-01-01 .. 2100-01-01, epoch seconds
+
+# Route legs are cut into small steps so the current is sampled along the way
+STEP_NM = 0.25
+# Below this speed-over-ground the boat is considered "not making way"
+MIN_SOG = 0.1
+
+
+# --- 1. GRID LOADING & CACHE ---
+class CurrentField:
+    def __init__(self, times, lats, lons, u, v):
+        # times: (T,) epoch seconds | lats: (Ny,) | lons: (Nx,) | u, v: (T, Ny, Nx) knots
+        self.times = times
+        self.lats = lats
+        self.lons = lons
+        self.u = u
+        self.v = v
+
+    def _bracket(self, axis, values):
+        # Index of the lower grid node + fractional weight, clamped to the grid edges
+        if len(axis) == 1:
+            return np.zeros(values.shape, dtype=np.intp), np.zeros(values.shape)
+        i = np.clip(np.searchsorted(axis, values) - 1, 0, len(axis) - 2)
+        w = (values - axis[i]) / (axis[i + 1] - axis[i])
+        return i, np.clip(w, 0.0, 1.0)
+
+    def sample(self, t, lat, lon):
+        # Trilinear interpolation of (u, v) for arrays of times/positions (broadcastable)
+        t, lat, lon = np.broadcast_arrays(np.asarray(t, float), np.asarray(lat, float), np.asarray(lon, float))
+        ti, tw = self._bracket(self.times, t)
+        yi, yw = self._bracket(self.lats, lat)
+        xi, xw = self._bracket(self.lons, lon)
+        t1 = np.minimum(ti + 1, len(self.times) - 1)
+        y1 = np.minimum(yi + 1, len(self.lats) - 1)
+        x1 = np.minimum(xi + 1, len(self.lons) - 1)
+
+        out = []
+        for grid in (self.u, self.v):
+            def plane(k):
+                a = grid[k, yi, xi] * (1 - xw) + grid[k, yi, x1] * xw
+                b = grid[k, y1, xi] * (1 - xw) + grid[k, y1, x1] * xw
+                return a * (1 - yw) + b * yw
+            out.append(plane(ti) * (1 - tw) + plane(t1) * tw)
+        return out[0], out[1]
+
+
+def _epoch_seconds(values):
+    # ISO strings -> epoch seconds, independent of the datetime resolution pandas picks (ns, us, s...)
+    ts = pd.to_datetime(values, utc=True)
+    return (ts - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)
+
+def _read_csv_grid(path):
+    df = pd.read_csv(path)
+    if pd.api.types.is_numeric_dtype(df['time']):
+        df['time'] = df['time'].astype(float)
+    else:
+        df['time'] = _epoch_seconds(df['time']).astype(float)
+
+    times = np.sort(df['time'].unique())
+    # A unit slip (ms epochs, a 1000x resolution error) would silently clamp every departure to the
+    # first/last grid step, so refuse anything outside a sane date range
+    if len(times) == 0 or times[0] < GRID_TIME_RANGE[0] or times[-1] > GRID_TIME_RANGE[1]:
+        raise ValueError(f"{path}: grid times {times[:1]}..{times[-1:]} are not epoch seconds between 1990 and 2100 "
+                         f"(use ISO timestamps or epoch seconds)")
+    lats = np.sort(df['lat'].unique())
+    lons = np.sort(df['lon'].unique())
+    u = np.zeros((len(times), len(lats), len(lons)), dtype=np.float32)
+    v = np.zeros_like(u)
+
+    ti = np.searchsorted(times, df['time'].to_numpy())
+    yi = np.searchsorted(lats, df['lat'].to_numpy())
+    xi = np.searchsorted(lons, df['lon'].to_numpy())
+    u[ti, yi, xi] = df['u'].to_numpy()
+    v[ti, yi, xi] = df['v'].to_numpy()
+    return times, lats, lons, u, v
+
+
+def _read_netcdf_grid(path):
+    try:
+        import netCDF4
+    except ImportError:
+        raise RuntimeError("Reading NetCDF current grids needs 'netCDF4' (pip install netCDF4)")
+
+    def pick(ds, names):
+        for n in names:
+            if n in ds.variables: return ds.variables[n]
+        raise KeyError(f"None of {names} found in {path}")
+
+    with netCDF4.Dataset(path) as ds:
+        tvar = pick(ds, ['time'])
+        dates = netCDF4.num2date(tvar[:], tvar.units, only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+        times = np.array([pd.Timestamp(d, tz='UTC').timestamp() for d in dates])
+        lats = np.asarray(pick(ds, ['lat', 'latitude'])[:], dtype=float)
+        lons = np.asarray(pick(ds, ['lon', 'longitude'])[:], dtype=float)
+        uvar = pick(ds, ['u', 'water_u'])
+        vvar = pick(ds, ['v', 'water_v'])
+        scale = MS_TO_KTS if 'm' in getattr(uvar, 'units', '') and 's' in getattr(uvar, 'units', '') else 1.0
+        u = np.ma.filled(uvar[:], 0.0).astype(np.float32) * scale
+        v = np.ma.filled(vvar[:], 0.0).astype(np.float32) * scale
+
+    # Keep axes ascending so searchsorted works
+    if lats[0] > lats[-1]:
+        lats, u, v = lats[::-1], u[:, ::-1, :], v[:, ::-1, :]
+    return times, lats, lons, np.ascontiguousarray(u), np.ascontiguousarray(v)
+
+
+def load_current_field(path=CURRENT_GRID, cache_dir=CACHE_DIR):
+    # Parse the source grid once, then reuse memory-mapped .npy copies until the source changes
+    stat = os.stat(path)
+    key = hashlib.md5(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    base = os.path.join(cache_dir, f"currents_{key}")
+    names = ['times', 'lats', 'lons', 'u', 'v']
+
+    if not all(os.path.exists(f"{base}_{n}.npy") for n in names):
+        if path.endswith(".nc"):
+            arrays = _read_netcdf_grid(path)
+        else:
+            arrays = _read_csv_grid(path)
+        if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+        for n, a in zip(names, arrays):
+            np.save(f"{base}_{n}.npy", a)
+
+    times, lats, lons, u, v = [np.load(f"{base}_{n}.npy", mmap_mode='r') for n in names]
+    # Axes are tiny, keep them in RAM; the big u/v cubes stay memory-mapped
+    return CurrentField(np.array(times), np.array(lats), np.array(lons), u, v)
+
+
+# --- 2. ROUTE GEOMETRY ---
+def _leg_steps(coords, step_nm=STEP_NM):
+    # Cut a (lat, lon) path into short steps -> midpoints, lengths (nm) and unit course vectors (east, north)
+    pts = np.asarray(coords, dtype=float)
+    if len(pts) < 2:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty, empty
+
+    lat0, lon0 = pts[:-1, 0], pts[:-1, 1]
+    dlat = np.radians(pts[1:, 0] - lat0)
+    dlon = np.radians(pts[1:, 1] - lon0) * np.cos(np.radians((pts[1:, 0] + lat0) / 2))
+    seg_nm = np.hypot(dlat, dlon) * EARTH_RADIUS_NM
+
+    n = np.maximum(np.ceil(seg_nm / step_nm).astype(int), 1)
+    seg = np.repeat(np.arange(len(seg_nm)), n)
+    k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    frac = (k + 0.5) / n[seg]
+
+    mid_lat = lat0[seg] + (pts[1:, 0] - lat0)[seg] * frac
+    mid_lon = lon0[seg] + (pts[1:, 1] - lon0)[seg] * frac
+    length = (seg_nm / n)[seg]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ce = np.nan_to_num(dlon / np.hypot(dlat, dlon))[seg]
+        cn = np.nan_to_num(dlat / np.hypot(dlat, dlon))[seg]
+    return mid_lat, mid_lon, length, ce, cn
+
+
+# --- 3. ETA ENGINE ---
+def route_eta(legs, speeds, departures, field=None):
+    # legs: list of (lat, lon) paths | speeds: through-water speed per leg (kts)
+    # departures: epoch seconds (scalar or array, for a departure-time sweep)
+    # Legs run back to back. Returns per-leg distance (nm), SOG (kts) and arrival times (epoch s),
+    # the SOG/arrival arrays being shaped (n_legs, n_departures).
+    departures = np.atleast_1d(np.asarray(departures, dtype=float))
+    t = departures.copy()
+    dist, sog, arrivals = [], [], []
+
+    for coords, speed in zip(legs, speeds):
+        mid_lat, mid_lon, length, ce, cn = _leg_steps(coords)
+        leg_nm = length.sum()
+        start = t.copy()
+
+        for j in range(len(length)):
+            if field is None or speed <= 0:
+                ground = np.full_like(t, float(speed))
+            else:
+                cu, cv = field.sample(t, mid_lat[j], mid_lon[j])
+                along = cu * ce[j] + cv * cn[j]
+                cross = cu * cn[j] - cv * ce[j]
+                # Boat crabs into the cross-current to hold the track line
+                ground = np.sqrt(np.maximum(speed ** 2 - cross ** 2, 0.0)) + along
+            with np.errstate(divide='ignore'):
+                t = t + np.where(ground > MIN_SOG, length[j] / ground, np.inf) * 3600
+
+        hours = (t - start) / 3600
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sog.append(np.where(hours > 0, leg_nm / hours, 0.0))
+        dist.append(leg_nm)
+        arrivals.append(t.copy())
+
+    return np.array(dist), np.array(sog).reshape(-1, len(departures)), np.array(arrivals).reshape(-1, len(departures))
+
+
+def best_departure(legs, speeds, departures, field=None):
+    # Sweep departure times and return (departure, arrival) with the shortest total passage
+    departures = np.atleast_1d(np.asarray(departures, dtype=float))
+    _, _, arrivals = route_eta(legs, speeds, departures, field)
+    if len(arrivals) == 0:
+        return departures[0], departures[0]
+    passage = arrivals[-1] - departures
+    i = int(np.argmin(passage))
+    return departures[i], arrivals[-1][i]
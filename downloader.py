@@ -1,4 +1,6 @@
 import os
+import sys
+import json
 import requests
 import math
 
@@ -60,5 +62,40 @@ def download_tiles():
 
     print("✅ Download Complete! You can now run the App in Offline Mode.")
 
+def repair_tiles(manifest_path):
+    # Re-download the tiles listed by `python tilecheck.py verify` (overwrites broken copies).
+    # Each zoom comes from the source recorded in the manifest (charts or satellite), this file's charts otherwise.
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    tiles, sources = manifest['tiles'], manifest.get('sources', {})
+
+    print(f"🛠️ Repairing {len(tiles)} tiles...")
+    fixed = 0
+    for z, x, y, reason in tiles:
+        dir_path = f"{OUTPUT_DIR}/{z}/{x}"
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+        source = sources.get(str(z), {})
+        url = source.get('url', TILE_URL).format(z=z, x=x, y=y)
+        try:
+            response = requests.get(url, headers=source.get('headers', {}), timeout=10)
+            if response.status_code == 200 and response.content:
+                # Write to a temp file first so an interrupted run never leaves a truncated tile
+                with open(f"{dir_path}/{y}.png.part", 'wb') as f:
+                    f.write(response.content)
+                os.replace(f"{dir_path}/{y}.png.part", f"{dir_path}/{y}.png")
+                fixed += 1
+            else:
+                print(f"  {z}/{x}/{y} ({reason}): HTTP {response.status_code}")
+        except Exception as e:
+            print(f"  {z}/{x}/{y} ({reason}): {e}")
+
+    print(f"✅ Repaired {fixed}/{len(tiles)} tiles. Run tilecheck.py again to confirm.")
+
 if __name__ == "__main__":
-    download_tiles()
\ No newline at end of file
+    # python downloader.py --repair data/repair_manifest.json
+    if len(sys.argv) > 2 and sys.argv[1] == "--repair":
+        repair_tiles(sys.argv[2])
+    else:
+        download_tiles()
\ No newline at end of file
@@ -6,16 +6,30 @@ from geopy.distance import geodesic
 from streamlit_js_eval import get_geolocation
 import math
 import os
+import json
 import threading
 import pandas as pd
+import numpy as np
 import time
 from datetime import datetime
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+from urllib.parse import quote
+from http.server import ThreadingHTTPServer
+from currents import CURRENT_GRID, load_current_field, route_eta, best_departure
+from shared_state import open_backend
+from live_server import live_url, start_live_server, can_see, LiveFleetLayer
+from voice import clip_hash, send_clip, bandwidth_note
+from tilesync import TileSyncHandler
+from navigation import NavEngine
+from tracklog import import_track, list_tracks, load_display
+from ais import CPA_ALARM_NM, TCPA_ALARM_MIN, MS_TO_KTS, OwnShip, open_feed, start_ais_server, assess, alarm_list, AisLayer
+from autoroute import COASTLINE_FILE, WATER_MASK_FILE, load_nav_grid, find_route, route_to_feature
 
 # --- 1. SERVER & SHARED MEMORY ---
 def start_tile_server():
     try:
-        server = HTTPServer(('localhost', 8000), SimpleHTTPRequestHandler)
+        # Tiles (static/ only) + delta-sync endpoints (see tilesync.py). To sync from another machine set
+        # TILE_SERVER_HOST=0.0.0.0 and the same TILE_SYNC_TOKEN on both sides.
+        server = ThreadingHTTPServer((os.environ.get("TILE_SERVER_HOST", "localhost"), 8000), TileSyncHandler)
         server.serve_forever()
     except:
         pass
@@ -26,14 +40,40 @@ if 'server_started' not in st.session_state:
     st.session_state['server_started'] = True
 
 @st.cache_resource
-def get_shared_fleet():
-    # Stores User Locations: {'Callsign': {'lat':..., 'lon':...}}
-    return {}
+def get_shared_state():
+    # Fleet positions {'Callsign': {'lat':..., 'lon':...}} and voice notes
+    # [{'from': 'Maverick', 'to': 'All', 'time': '12:00', 'audio': bytes}], shared across workers
+    # (backend picked by the CHARTPLOTTER_STATE env var, see shared_state.py)
+    return open_backend()
 
 @st.cache_resource
-def get_shared_messages():
-    # Stores Voice Notes: [{'from': 'Maverick', 'to': 'All', 'time': '12:00', 'audio': bytes}]
-    return []
+def get_live_hub():
+    # SSE stream of fleet/comms deltas (port 8001) so the map updates without reruns
+    return start_live_server(get_shared_state())
+
+@st.cache_resource
+def get_ais_feed():
+    # AIS target table fed from UDP/TCP/replay (CHARTPLOTTER_AIS, see ais.py) + the /ais map endpoint (port 8002)
+    feed = open_feed()
+    if feed is not None: start_ais_server(feed)
+    return feed
+
+@st.cache_resource
+def get_current_field():
+    # Tidal current grid (memory-mapped), None if no grid has been downloaded
+    if not os.path.exists(CURRENT_GRID): return None
+    try:
+        return load_current_field(CURRENT_GRID)
+    except Exception as e:
+        # A bad grid file only disables tide-aware ETAs, not the whole page
+        print(f"Current grid not loaded: {e}")
+        return None
+
+@st.cache_resource
+def get_nav_grid():
+    # Navigable-water grid for auto-routing (cached on disk too), None without coastline data
+    if not (os.path.exists(COASTLINE_FILE) or os.path.exists(WATER_MASK_FILE)): return None
+    return load_nav_grid()
 
 # --- 2. SETUP & STATE ---
 st.set_page_config(page_title="EZChartplotter", page_icon="⚓", layout="wide")
@@ -43,6 +83,8 @@ if 'user_callsign' not in st.session_state: st.session_state['user_callsign'] =
 if 'pref_speed' not in st.session_state: st.session_state['pref_speed'] = 20
 if 'pref_privacy' not in st.session_state: st.session_state['pref_privacy'] = "Public"
 if 'pref_allowed' not in st.session_state: st.session_state['pref_allowed'] = []
+if 'pref_cpa_nm' not in st.session_state: st.session_state['pref_cpa_nm'] = CPA_ALARM_NM
+if 'pref_tcpa_min' not in st.session_state: st.session_state['pref_tcpa_min'] = TCPA_ALARM_MIN
 
 # Navigation State
 if 'lat' not in st.session_state: st.session_state['lat'] = 29.5500
@@ -50,6 +92,12 @@ if 'lon' not in st.session_state: st.session_state['lon'] = -94.9000
 if 'track' not in st.session_state: st.session_state['track'] = [] 
 if 'polylines' not in st.session_state: st.session_state['polylines'] = []
 if 'route_speeds' not in st.session_state: st.session_state['route_speeds'] = {}
+if 'last_clip_sha' not in st.session_state: st.session_state['last_clip_sha'] = None
+if 'autoroute_pts' not in st.session_state: st.session_state['autoroute_pts'] = []
+if 'autoroute_last_click' not in st.session_state: st.session_state['autoroute_last_click'] = None
+if 'nav' not in st.session_state: st.session_state['nav'] = None
+if 'own_ship' not in st.session_state: st.session_state['own_ship'] = OwnShip()   # This boat, for AIS CPA/TCPA
+if 'imported_files' not in st.session_state: st.session_state['imported_files'] = []
 
 # --- 3. HELPER FUNCTIONS ---
 def format_duration(hours):
@@ -73,6 +121,35 @@ def get_stats_html(coords, speed_kts, leg_id):
     </div>
     """
 
+def set_legs(legs):
+    # Replace the leg list; speeds are keyed by position, so each kept leg takes its speed along
+    old, speeds = st.session_state['polylines'], {}
+    for i, feat in enumerate(legs):
+        if feat in old and str(old.index(feat)) in st.session_state['route_speeds']:
+            speeds[str(i)] = st.session_state['route_speeds'][str(old.index(feat))]
+    st.session_state['polylines'] = legs
+    st.session_state['route_speeds'] = speeds
+
+def get_nav_engine():
+    # Segment index over all planned legs, rebuilt only when the legs or their speeds change
+    routes = [[(c[1], c[0]) for c in feat['geometry']['coordinates']] for feat in st.session_state['polylines']]
+    speeds = [st.session_state['route_speeds'].get(str(i), st.session_state['pref_speed']) for i in range(len(routes))]
+    key = json.dumps([routes, speeds])
+    if st.session_state.get('nav_engine_key') != key:
+        st.session_state['nav_engine'] = NavEngine(routes, speeds)
+        st.session_state['nav_engine_key'] = key
+        st.session_state['nav'] = None   # Leg numbers / WP of the last fix no longer apply
+    return st.session_state['nav_engine']
+
+def show_nav_panel(nav):
+    n1, n2, n3, n4, n5 = st.columns(5)
+    side = "R" if nav['xte_nm'] >= 0 else "L"
+    n1.metric("XTE", f"{abs(nav['xte_nm']):.2f} nm {side}")
+    n2.metric(f"To WP (Leg #{nav['route'] + 1})", f"{nav['dist_to_wp_nm']:.2f} nm")
+    n3.metric("BRG", f"{nav['brg_to_wp']:.0f}° True")
+    n4.metric("VMG", f"{nav['vmg']:.1f} kts" if nav['vmg'] is not None else "--")
+    n5.metric("ETA (Remaining)", format_duration(nav['eta_hours']), f"{nav['remaining_nm']:.1f} nm", delta_color="off")
+
 # --- 4. PAGE: SETTINGS ---
 def show_settings():
     st.title("⚙️ User Settings")
@@ -105,6 +182,7 @@ def show_settings():
 # --- 5. PAGE: CHARTPLOTTER ---
 def show_chartplotter():
     st.title(f"⚓ EZChartplotter")
+    nav_panel = st.container()
     
     # --- SIDEBAR: COMMS (VOICE) ---
     st.sidebar.subheader("🎙️ Fleet Comms (PTT)")
@@ -123,26 +201,23 @@ def show_chartplotter():
     
     # 3. Save Logic (With Privacy Routing)
     if audio_value:
-        messages = get_shared_messages()
+        raw = audio_value.getvalue()
         sender = st.session_state['user_callsign'] if st.session_state['user_callsign'] else "Unknown"
         timestamp = datetime.now().strftime("%H:%M")
         
-        # Deduplication check
-        is_duplicate = False
-        if messages and messages[-1]['audio'] == audio_value:
-            is_duplicate = True
+        # Deduplication check (the widget keeps its value across reruns)
+        is_duplicate = st.session_state['last_clip_sha'] == clip_hash(raw)
         
         if not is_duplicate:
+            st.session_state['last_clip_sha'] = clip_hash(raw)
             # SAVE MESSAGE WITH 'TO' FIELD
             new_msg = {
                 'from': sender, 
                 'to': target_recipient, # 'All' or specific name
-                'time': timestamp, 
-                'audio': audio_value
+                'time': timestamp
             }
-            messages.append(new_msg)
-            # Keep history short
-            if len(messages) > 15: messages.pop(0)
+            # Compressed on a worker thread, stored with duration/size metadata
+            send_clip(get_shared_state(), new_msg, raw)
             
             if target_recipient == "All":
                 st.toast(f"Broadcast sent!", icon="📡")
@@ -150,7 +225,7 @@ def show_chartplotter():
                 st.toast(f"Private message sent to {target_recipient}", icon="🔒")
     
     # 4. Display Messages (With Filtering)
-    messages = get_shared_messages()
+    messages = get_shared_state().get_messages(with_audio=False)
     my_name = st.session_state['user_callsign']
     
     with st.sidebar.expander("🔊 Recent Messages", expanded=True):
@@ -180,7 +255,10 @@ def show_chartplotter():
                         st.markdown(f":red[{label}]") # Highlight private msgs in red
                     else:
                         st.markdown(label)
-                    st.audio(msg['audio'])
+                    # Streamed from the clip server (range requests) instead of inlined on every rerun
+                    st.audio(f"{live_url(st.context.url)}/clips/{msg['id']}?me={quote(my_name)}", format=msg.get('mime', "audio/wav"))
+                    note = bandwidth_note(msg)
+                    if note: st.caption(f"🗜️ {note}")
                     st.divider()
         
         if st.button("🔄 Refresh Comms"):
@@ -198,6 +276,17 @@ def show_chartplotter():
             st.session_state['lat'] = loc['coords']['latitude']
             st.session_state['lon'] = loc['coords']['longitude']
             
+            # Live navigation against the planned legs
+            if st.session_state['polylines']:
+                st.session_state['nav'] = get_nav_engine().update(st.session_state['lat'], st.session_state['lon'])
+
+            # Own-ship state for AIS collision alarms (uses the GPS speed/heading when the device reports them)
+            if get_ais_feed() is not None:
+                speed, heading = loc['coords'].get('speed'), loc['coords'].get('heading')
+                moving = isinstance(speed, (int, float)) and isinstance(heading, (int, float)) and not math.isnan(heading)
+                st.session_state['own_ship'].fix(st.session_state['lat'], st.session_state['lon'],
+                                                 sog=speed * MS_TO_KTS if moving else None, cog=heading if moving else None)
+            
             if is_recording:
                 current = (st.session_state['lat'], st.session_state['lon'])
                 if not st.session_state['track'] or st.session_state['track'][-1] != current:
@@ -205,38 +294,74 @@ def show_chartplotter():
             
             # Broadcast Location
             if st.session_state['user_callsign']:
-                fleet = get_shared_fleet()
+                shared = get_shared_state()
                 if st.session_state['pref_privacy'] == "Hidden":
-                    if st.session_state['user_callsign'] in fleet: del fleet[st.session_state['user_callsign']]
+                    shared.remove_positions([st.session_state['user_callsign']])
                 else:
-                    fleet[st.session_state['user_callsign']] = {
+                    shared.put_positions({st.session_state['user_callsign']: {
                         "lat": st.session_state['lat'], "lon": st.session_state['lon'], 
                         "last_seen": time.time(), "privacy": st.session_state['pref_privacy'], 
                         "allowed": st.session_state['pref_allowed']
-                    }
+                    }})
+
+    if st.session_state['nav']: get_nav_engine()   # Drops the last fix if legs were edited since
+    if st.session_state['nav'] and st.session_state['polylines']:
+        with nav_panel: show_nav_panel(st.session_state['nav'])
 
     # Fleet Watch Logic
     st.sidebar.markdown("---")
     st.sidebar.subheader("🔭 Fleet Watch")
     friend_input = st.sidebar.text_input("Find Friend")
-    active_friends = []
     
     if friend_input:
-        fleet = get_shared_fleet()
+        fleet = get_shared_state().get_fleet()
         if friend_input in fleet:
             data = fleet[friend_input]
-            can_see = False
-            if data['privacy'] == "Public": can_see = True
-            elif data['privacy'] == "Private (Only Whitelist)" and st.session_state['user_callsign'] in data['allowed']: can_see = True
-            
-            if can_see:
-                active_friends.append((friend_input, data))
+            if can_see(data, st.session_state['user_callsign']):
                 st.sidebar.success(f"Tracking **{friend_input}**")
             else:
                 st.sidebar.error("⛔ Private")
         else:
             st.sidebar.warning("Offline")
 
+    # AIS Traffic: the map layer refreshes itself, the sidebar only summarises on reruns
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🚢 AIS Traffic")
+    ais_feed = get_ais_feed()
+    if ais_feed is None:
+        st.sidebar.caption("AIS off (set CHARTPLOTTER_AIS)")
+    else:
+        a1, a2 = st.sidebar.columns(2)
+        st.session_state['pref_cpa_nm'] = a1.number_input("CPA Alarm (nm)", 0.1, 5.0, float(st.session_state['pref_cpa_nm']), 0.1)
+        st.session_state['pref_tcpa_min'] = a2.number_input("TCPA Alarm (min)", 1, 60, int(st.session_state['pref_tcpa_min']))
+        st.session_state['own_ship'].seed(st.session_state['lat'], st.session_state['lon'])
+        state = assess(ais_feed.table.snapshot(), st.session_state['own_ship'], cpa_nm=st.session_state['pref_cpa_nm'], tcpa_min=st.session_state['pref_tcpa_min'])
+        st.sidebar.caption(f"📡 {ais_feed.status} · {len(state['mmsi'])} targets")
+        for a in alarm_list(state)[:5]:
+            st.sidebar.error(f"⚠️ **{a['name'] or a['mmsi']}** CPA {a['cpa']:.2f} nm in {a['tcpa']:.0f} min")
+
+    # Track Logs (GPX / NMEA / CSV), streamed into data/tracks
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("📂 Track Logs")
+    log_file = st.sidebar.file_uploader("Import Log", type=["gpx", "nmea", "txt", "log", "csv"])
+    # Uploads are held in memory (Streamlit caps them at 200 MB); the CLI streams straight from disk
+    st.sidebar.caption("Logs over 200 MB: `python tracklog.py <file>`")
+    if log_file and log_file.file_id not in st.session_state['imported_files']:
+        with st.spinner("Importing track..."):
+            summary = import_track(log_file, log_file.name)
+        st.session_state['imported_files'].append(log_file.file_id)
+        st.sidebar.success(f"Imported {summary['points']:,} points")
+
+    shown_log = None
+    saved_logs = {t['id']: t for t in list_tracks()}
+    if saved_logs:
+        choice = st.sidebar.selectbox("Show Log", ["None"] + list(saved_logs))
+        if choice != "None":
+            shown_log = saved_logs[choice]
+            avg = f"{shown_log['avg_sog']} kts" if shown_log['avg_sog'] else "--"
+            st.sidebar.caption(f"{shown_log['distance_nm']} nm · moving {format_duration(shown_log['moving_hours'])} · "
+                               f"avg {avg} · max {shown_log['max_sog']} kts")
+
     # --- MAP LAYERS ---
     m = folium.Map(location=[st.session_state['lat'], st.session_state['lon']], zoom_start=14, tiles=None)
 
@@ -248,9 +373,16 @@ def show_chartplotter():
     # Tracks
     if len(st.session_state['track']) > 1:
         folium.PolyLine(st.session_state['track'], color="gray", weight=3, dash_array="5, 10").add_to(m)
+    if shown_log:
+        folium.PolyLine(load_display(shown_log['id']), color="#444444", weight=3, opacity=0.8, tooltip=shown_log['source']).add_to(m)
 
     # Routes
     show_routes = st.sidebar.toggle("Show Routes", True)
+    nav_grid = get_nav_grid()
+    auto_mode = False
+    if nav_grid is not None:
+        auto_mode = st.sidebar.toggle("🧭 Auto-Route (click start, then end)", False)
+        if not auto_mode: st.session_state['autoroute_pts'] = []
     drawn_routes = folium.FeatureGroup(name="Planned Routes")
     
     if show_routes and st.session_state['polylines']:
@@ -266,6 +398,9 @@ def show_chartplotter():
             line.add_to(drawn_routes)
     drawn_routes.add_to(m)
 
+    for pt in st.session_state['autoroute_pts']:
+        folium.CircleMarker(pt, radius=6, color="magenta", fill=True, tooltip="Auto-Route Start").add_to(m)
+
     draw = Draw(
         export=False, position="topleft",
         draw_options={"polyline": {"shapeOptions": {"color": "#ff00ff", "weight": 5}}, "polygon": False, "rectangle": False, "circle": False, "marker": False, "circlemarker": False},
@@ -275,33 +410,81 @@ def show_chartplotter():
 
     # Markers
     folium.Marker([st.session_state['lat'], st.session_state['lon']], popup=f"<b>ME</b><br>{st.session_state['user_callsign']}", icon=folium.Icon(color="blue", icon="location-arrow", prefix="fa")).add_to(m)
-    for name, data in active_friends:
-        folium.Marker([data['lat'], data['lon']], popup=f"<b>{name}</b><br>{datetime.fromtimestamp(data['last_seen']).strftime('%H:%M')}", icon=folium.Icon(color="orange", icon="ship", prefix="fa")).add_to(m)
+    # Friend markers are drawn & moved by the live stream (first snapshot arrives on connect)
+    get_live_hub()
+    LiveFleetLayer(me=st.session_state['user_callsign'], watch=[friend_input] if friend_input else []).add_to(m)
+    if ais_feed is not None:
+        AisLayer(st.session_state['pref_cpa_nm'], st.session_state['pref_tcpa_min'], own=st.session_state['own_ship']).add_to(m)
 
     folium.LayerControl().add_to(m)
     output = st_folium(m, width=1200, height=600)
 
     if output and "all_drawings" in output:
-        if output["all_drawings"] != st.session_state['polylines']:
-            st.session_state['polylines'] = output["all_drawings"]
+        # Auto routes never go through the Draw plugin, so keep them when syncing hand-drawn legs.
+        # Legs stay in creation order: existing ones keep their place, new drawings go to the end.
+        drawn = output["all_drawings"] or []
+        current = st.session_state['polylines']
+        legs = [f for f in current if f.get('properties', {}).get('auto') or f in drawn] + [f for f in drawn if f not in current]
+        if legs != current:
+            set_legs(legs)
+            st.rerun()
+
+    # Auto-Route: two map clicks -> land-avoiding leg
+    if auto_mode and output and output.get("last_clicked"):
+        click = (output["last_clicked"]["lat"], output["last_clicked"]["lng"])
+        if click != st.session_state['autoroute_last_click']:
+            st.session_state['autoroute_last_click'] = click
+            st.session_state['autoroute_pts'].append(click)
+            if len(st.session_state['autoroute_pts']) == 2:
+                start, end = st.session_state['autoroute_pts']
+                st.session_state['autoroute_pts'] = []
+                path = find_route(nav_grid, start, end)
+                if path:
+                    st.session_state['polylines'].append(route_to_feature(path))
+                    st.toast("Route found!", icon="🧭")
+                else:
+                    st.toast("No water route between those points", icon="⛔")
             st.rerun()
 
     # Speed Editor
     if st.session_state['polylines']:
         st.markdown("### 📋 Speed Editor")
-        table_data = []
+        field = get_current_field()
+        legs, speeds = [], []
         for i, feat in enumerate(st.session_state['polylines']):
-            coords = [(c[1], c[0]) for c in feat['geometry']['coordinates']]
+            legs.append([(c[1], c[0]) for c in feat['geometry']['coordinates']])
+            speeds.append(st.session_state['route_speeds'].get(str(i), st.session_state['pref_speed']))
+
+        # Tide-aware ETA: integrate each leg through the current grid (falls back to still water)
+        if field is not None:
+            dc1, dc2 = st.columns(2)
+            dep_date = dc1.date_input("Departure Date", value=datetime.now().date())
+            dep_time = dc2.time_input("Departure Time", value=datetime.now().time().replace(second=0, microsecond=0))
+            departure = datetime.combine(dep_date, dep_time).timestamp()
+            _, sogs, arrivals = route_eta(legs, speeds, departure, field)
+
+            # Sweep the next 12 hours in 10 minute steps for the fastest tide window
+            best_dep, best_arr = best_departure(legs, speeds, departure + np.arange(0, 12 * 3600, 600), field)
+            st.caption(f"🌊 Fastest departure in the next 12h: **{datetime.fromtimestamp(best_dep).strftime('%H:%M')}** ({format_duration((best_arr - best_dep) / 3600)} underway)")
+
+        table_data = []
+        for i, coords in enumerate(legs):
             seg_dist = sum([geodesic(coords[j], coords[j+1]).nm for j in range(len(coords)-1)])
-            speed = st.session_state['route_speeds'].get(str(i), st.session_state['pref_speed'])
+            speed = speeds[i]
             time = seg_dist / speed if speed > 0 else 0
-            table_data.append({"Leg ID": i+1, "Dist": round(seg_dist, 2), "Speed (kts)": int(speed), "Time": format_duration(time)})
+            row = {"Leg ID": i+1, "Dist": round(seg_dist, 2), "Speed (kts)": int(speed), "Time": format_duration(time)}
+            if field is not None:
+                leg_start = departure if i == 0 else arrivals[i-1][0]
+                row["SOG (kts)"] = round(float(sogs[i][0]), 1)
+                row["Time w/ Current"] = format_duration((arrivals[i][0] - leg_start) / 3600)
+                row["Arrive"] = datetime.fromtimestamp(arrivals[i][0]).strftime('%H:%M') if math.isfinite(arrivals[i][0]) else "--"
+            table_data.append(row)
         
         edited = st.data_editor(pd.DataFrame(table_data), use_container_width=True, num_rows="dynamic", key="editor")
         
         if len(edited) < len(st.session_state['polylines']):
             rem_idx = [row["Leg ID"] - 1 for i, row in edited.iterrows()]
-            st.session_state['polylines'] = [st.session_state['polylines'][i] for i in rem_idx]
+            set_legs([st.session_state['polylines'][i] for i in rem_idx])
             st.rerun()
 
         change = False
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import queue
+import threading
+from urllib.parse import urlparse, urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from branca.element import MacroElement
+from jinja2 import Template
+
+# --- CONFIGURATION ---
+LIVE_PORT = 8001
+# Host the browser should use for clips when it differs from the app URL (reverse proxy, port forward)
+PUBLIC_HOST = os.environ.get("CHARTPLOTTER_PUBLIC_HOST", "")
+POLL_INTERVAL = 0.25      # How often the shared state is checked for changes (seconds)
+HEARTBEAT = 15            # Keep-alive comment for idle connections (seconds)
+MAX_QUEUE = 50            # Per-client backlog; slow clients get a fresh snapshot instead
+
+
+# --- 1. PRIVACY ---
+def can_see(data, viewer):
+    if data['privacy'] == "Public": return True
+    return data['privacy'] == "Private (Only Whitelist)" and viewer in data.get('allowed', [])
+
+def can_hear(msg, viewer):
+    return msg['to'] == 'All' or msg['to'] == viewer or msg['from'] == viewer
+
+
+def live_url(page_url=""):
+    # Base URL of the clip/SSE server as the *browser* sees it: same host as the page it loaded
+    # (like LiveFleetLayer's window.location.hostname), so phones on the boat Wi-Fi can play clips too
+    parts = urlsplit(page_url or "http://localhost")
+    host = PUBLIC_HOST or parts.hostname or "localhost"
+    if ":" in host: host = f"[{host}]"   # IPv6
+    return f"{parts.scheme or 'http'}://{host}:{LIVE_PORT}"
+
+
+# --- 2. DELTA BROADCASTER ---
+class LiveHub:
+    # One poller computes fleet/message deltas once per tick and fans them out,
+    # so the cost per connected boat is just a filter + a socket write
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.fleet = {}
+        self.last_msg_id = 0
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.fleet)
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=MAX_QUEUE)
+        with self.lock: self.clients.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock: self.clients.discard(q)
+
+    def poll_once(self):
+        fleet = self.backend.get_fleet()
+        changed = {k: v for k, v in fleet.items() if self.fleet.get(k) != v}
+        gone = [k for k in self.fleet if k not in fleet]
+        new_msgs = [{k: m[k] for k in ('id', 'from', 'to', 'time')}
+                    for m in self.backend.get_messages(with_audio=False) if m['id'] > self.last_msg_id]
+        if not (changed or gone or new_msgs): return
+
+        with self.lock:
+            self.fleet = fleet
+            if new_msgs: self.last_msg_id = new_msgs[-1]['id']
+            delta = {'changed': changed, 'gone': gone, 'messages': new_msgs}
+            for q in list(self.clients):
+                try:
+                    q.put_nowait(delta)
+                except queue.Full:
+                    # Too far behind: drop the backlog, the client gets a full snapshot next
+                    with q.mutex: q.queue.clear()
+                    q.put_nowait(None)
+
+    def run(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Live hub error: {e}")
+            time.sleep(POLL_INTERVAL)
+
+
+# --- 3. SSE & CLIP SERVER ---
+def start_live_server(backend, port=LIVE_PORT):
+    hub = LiveHub(backend)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, event, payload):
+            self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+
+        def _fleet_event(self, fleet, gone, me, watch):
+            visible = {k: {'lat': v['lat'], 'lon': v['lon'], 'last_seen': v['last_seen']}
+                       for k, v in fleet.items() if k in watch and can_see(v, me)}
+            # Boats that went hidden/private for us disappear the same way as boats that left
+            hidden = [k for k, v in fleet.items() if k in watch and not can_see(v, me)]
+            if visible or gone or hidden:
+                self._send("fleet", {'changed': visible, 'gone': [k for k in gone if k in watch] + hidden})
+
+        def _send_clip(self, msg_id, me):
+            # Voice notes with HTTP Range support so the browser starts playing after the first chunk
+            clip = hub.backend.get_clip(msg_id)
+            if clip is None or not can_hear(clip, me):
+                self.send_error(404)
+                return
+            data = clip['audio']
+            start, end = 0, len(data) - 1
+            rng = self.headers.get("Range", "")
+            if rng.startswith("bytes="):
+                first, _, last = rng[6:].split(",")[0].partition("-")
+                try:
+                    if first:
+                        start, end = int(first), int(last) if last else end
+                    elif last:
+                        start = max(len(data) - int(last), 0)
+                except ValueError:
+                    start = len(data)   # Malformed range (e.g. bytes=abc-): answered with 416 below
+                if start > end or start >= len(data):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(data)}")
+                    self.end_headers()
+                    return
+                end = min(end, len(data) - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", clip.get('mime', "audio/wav"))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Cache-Control", "private, max-age=86400")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(data[start:end + 1])
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            args = parse_qs(url.query)
+            if url.path.startswith("/clips/"):
+                try:
+                    msg_id = int(url.path.rsplit("/", 1)[-1])
+                except ValueError:
+                    self.send_error(404)
+                    return
+                self._send_clip(msg_id, args.get('me', [''])[0])
+                return
+            if url.path != "/events":
+                self.send_error(404)
+                return
+            me = args.get('me', [''])[0]
+            watch = set(w for w in args.get('watch', [''])[0].split(",") if w)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+
+            q = hub.subscribe()
+            try:
+                self._fleet_event(hub.snapshot(), [], me, watch)
+                while True:
+                    try:
+                        delta = q.get(timeout=HEARTBEAT)
+                    except queue.Empty:
+                        self.wfile.write(b": ping\n\n")
+                        self.wfile.flush()
+                        continue
+                    if delta is None:
+                        self._fleet_event(hub.snapshot(), [], me, watch)
+                        continue
+                    self._fleet_event(delta['changed'], delta['gone'], me, watch)
+                    heard = [m for m in delta['messages'] if can_hear(m, me) and m['from'] != me]
+                    if heard: self._send("messages", heard)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                hub.unsubscribe(q)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128
+
+    try:
+        server = Server(('0.0.0.0', port), Handler)
+    except OSError:
+        # Another worker already serves the stream from the same shared state
+        return None
+    threading.Thread(target=hub.run, daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return hub
+
+
+# --- 4. MAP SIDE ---
+class LiveFleetLayer(MacroElement):
+    # Subscribes the Leaflet map to the SSE stream and moves friend markers in place (no Streamlit rerun)
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var markers = {};
+            var icon = L.AwesomeMarkers ? L.AwesomeMarkers.icon({icon: 'ship', prefix: 'fa', markerColor: 'orange'}) : undefined;
+            var banner = L.control({position: 'bottomleft'});
+            banner.onAdd = function() {
+                this._div = L.DomUtil.create('div');
+                this._div.style.cssText = 'background:white;padding:4px 8px;border-radius:4px;font-family:sans-serif;display:none';
+                return this._div;
+            };
+            banner.addTo(map);
+
+            // Callsigns are free text from other users: only ever inserted as text nodes
+            function label(bold, rest) {
+                var el = document.createElement('span');
+                var b = document.createElement('b');
+                b.textContent = bold;
+                el.appendChild(b);
+                el.appendChild(document.createTextNode(rest));
+                return el;
+            }
+
+            var url = window.location.protocol + '//' + window.location.hostname + ':{{ this.port }}/events'
+                + '?me=' + encodeURIComponent({{ this.me|tojson }}) + '&watch=' + encodeURIComponent({{ this.watch|tojson }});
+            var source = new EventSource(url);
+            source.addEventListener('fleet', function(e) {
+                var d = JSON.parse(e.data);
+                Object.keys(d.changed).forEach(function(name) {
+                    var b = d.changed[name];
+                    var t = new Date(b.last_seen * 1000).toTimeString().slice(0, 5);
+                    if (markers[name]) {
+                        markers[name].setLatLng([b.lat, b.lon]);
+                    } else {
+                        markers[name] = L.marker([b.lat, b.lon], icon ? {icon: icon} : {}).addTo(map);
+                    }
+                    markers[name].bindPopup(label(name, ' · ' + t));
+                });
+                d.gone.forEach(function(name) {
+                    if (markers[name]) { map.removeLayer(markers[name]); delete markers[name]; }
+                });
+            });
+            source.addEventListener('messages', function(e) {
+                var msgs = JSON.parse(e.data);
+                var m = msgs[msgs.length - 1];
+                banner._div.textContent = '🎙️ ';
+                banner._div.appendChild(label(m.from, ' (' + m.time + ')' + (m.to !== 'All' ? ' 🔒' : '') + ' – refresh comms to play'));
+                banner._div.style.display = 'block';
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, me="", watch=(), port=LIVE_PORT):
+        super().__init__()
+        self._name = "LiveFleetLayer"
+        self.me = me
+        self.watch = ",".join(watch)
+        self.port = port
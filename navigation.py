@@ -0,0 +1,109 @@
+import math
+import time
+import numpy as np
+
+# --- CONFIGURATION ---
+EARTH_RADIUS_NM = 3440.065
+# If the boat is further than this from every segment ahead, search the whole route again
+REACQUIRE_NM = 0.5
+# Fixes closer together than this (seconds) don't update SOG/COG
+MIN_FIX_INTERVAL = 0.05
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dl = math.radians(lon2 - lon1)
+    x = math.sin(dl) * math.cos(p2)
+    y = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+class NavEngine:
+    # Precomputes every segment of the active routes (legs run back to back) in a local flat
+    # projection, so each GPS fix is a handful of vectorized NumPy operations.
+    def __init__(self, routes, speeds):
+        # routes: list of [(lat, lon), ...] | speeds: planned speed per route (kts)
+        pts, seg_route, seg_speed = [], [], []
+        for r, (path, speed) in enumerate(zip(routes, speeds)):
+            if len(path) < 2: continue
+            for a, b in zip(path[:-1], path[1:]):
+                pts.append((a, b))
+                seg_route.append(r)
+                seg_speed.append(speed)
+
+        self.n = len(pts)
+        self.last_fix = None
+        self.active = 0
+        if self.n == 0: return
+
+        seg = np.asarray(pts, dtype=float)                 # (n, 2 ends, lat/lon)
+        self.ref_lat = seg[:, :, 0].mean()
+        self.kx = 60 * math.cos(math.radians(self.ref_lat))  # nm per degree of longitude
+        self.end_ll = seg[:, 1, :]
+        self.ax, self.ay = seg[:, 0, 1] * self.kx, seg[:, 0, 0] * 60
+        self.dx = seg[:, 1, 1] * self.kx - self.ax
+        self.dy = seg[:, 1, 0] * 60 - self.ay
+        self.len2 = np.maximum(self.dx ** 2 + self.dy ** 2, 1e-12)
+        self.length = np.sqrt(self.len2)
+        self.route = np.asarray(seg_route)
+        self.speed = np.asarray(seg_speed, dtype=float)
+
+        # Distance / planned time still to go *after* each segment, to the end of the last route
+        self.after_nm = np.concatenate([np.cumsum(self.length[::-1])[::-1][1:], [0.0]])
+        with np.errstate(divide='ignore'):
+            seg_hours = np.where(self.speed > 0, self.length / self.speed, np.inf)
+        self.after_hours = np.concatenate([np.cumsum(seg_hours[::-1])[::-1][1:], [0.0]])
+
+    def _project(self, x, y, idx):
+        t = np.clip(((x - self.ax[idx]) * self.dx[idx] + (y - self.ay[idx]) * self.dy[idx]) / self.len2[idx], 0.0, 1.0)
+        px, py = self.ax[idx] + t * self.dx[idx], self.ay[idx] + t * self.dy[idx]
+        return t, np.hypot(x - px, y - py)
+
+    def update(self, lat, lon, t=None):
+        # Feed one fix -> dict of live navigation data (None when there is no route)
+        if self.n == 0: return None
+        t = time.time() if t is None else t
+        x, y = lon * self.kx, lat * 60
+
+        # Search forward from the active segment first so overlapping legs don't make us jump back
+        ahead = np.arange(self.active, self.n)
+        _, dist = self._project(x, y, ahead)
+        k = int(np.argmin(dist))
+        if dist[k] > REACQUIRE_NM:
+            ahead = np.arange(self.n)
+            _, dist = self._project(x, y, ahead)
+            k = int(np.argmin(dist))
+        i = int(ahead[k])
+        self.active = i
+
+        # Signed cross-track error: + = right of track
+        cross = ((x - self.ax[i]) * self.dy[i] - (y - self.ay[i]) * self.dx[i]) / self.length[i]
+
+        wp_lat, wp_lon = self.end_ll[i]
+        to_wp = math.hypot(wp_lon * self.kx - x, wp_lat * 60 - y)
+        brg = bearing_deg(lat, lon, wp_lat, wp_lon)
+
+        sog, cog = None, None
+        if self.last_fix is not None and t - self.last_fix[2] >= MIN_FIX_INTERVAL:
+            plat, plon, pt = self.last_fix
+            moved = math.hypot((lon - plon) * self.kx, (lat - plat) * 60)
+            sog = moved / ((t - pt) / 3600)
+            cog = bearing_deg(plat, plon, lat, lon) if moved > 0 else None
+        if self.last_fix is None or sog is not None:
+            self.last_fix = (lat, lon, t)
+        vmg = sog * math.cos(math.radians(cog - brg)) if sog is not None and cog is not None else None
+
+        remaining = to_wp + self.after_nm[i]
+        # VMG only says how fast we close on *this* waypoint; later legs run on other headings,
+        # so they keep their planned timing
+        planned_to_wp = to_wp / self.speed[i] if self.speed[i] > 0 else math.inf
+        eta_hours = (to_wp / vmg if vmg and vmg > 0 else planned_to_wp) + self.after_hours[i]
+
+        return {
+            'route': int(self.route[i]), 'segment': i,
+            'xte_nm': float(cross), 'wp': (float(wp_lat), float(wp_lon)),
+            'dist_to_wp_nm': float(to_wp), 'brg_to_wp': brg,
+            'sog': sog, 'cog': cog, 'vmg': vmg,
+            'remaining_nm': float(remaining),
+            'eta_hours': float(eta_hours),
+        }
@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import base64
+import sqlite3
+import threading
+import urllib.request
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURATION ---
+# Where fleet positions & voice notes live. Pick one with the CHARTPLOTTER_STATE env var:
+#   memory                 -> this process only (single Streamlit worker)
+#   sqlite:<path>          -> shared by every worker on this machine (WAL mode)
+#   kv:<host>:<port>       -> shared through a running `python shared_state.py serve` instance
+DEFAULT_BACKEND = "sqlite:data/shared_state.db"
+KV_PORT = 8765
+
+# Keep history short
+MAX_MESSAGES = 15
+
+
+# --- 1. IN-PROCESS BACKEND ---
+class MemoryBackend:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fleet = {}
+        self.messages = []
+        self.next_id = 1
+
+    def put_positions(self, positions):
+        # positions: {'Callsign': {'lat':..., 'lon':..., 'last_seen':..., 'privacy':..., 'allowed': [...]}}
+        with self.lock:
+            self.fleet.update({k: dict(v) for k, v in positions.items()})
+
+    def remove_positions(self, callsigns):
+        with self.lock:
+            for c in callsigns: self.fleet.pop(c, None)
+
+    def get_fleet(self):
+        with self.lock:
+            return {k: dict(v) for k, v in self.fleet.items()}
+
+    def add_messages(self, messages):
+        # messages: [{'from':..., 'to':..., 'time':..., 'audio': bytes, ...extra metadata}] -> list of new ids
+        with self.lock:
+            ids = []
+            for msg in messages:
+                self.messages.append(dict(msg, id=self.next_id))
+                ids.append(self.next_id)
+                self.next_id += 1
+            del self.messages[:-MAX_MESSAGES]
+            return ids
+
+    def get_messages(self, limit=MAX_MESSAGES, with_audio=True):
+        # Oldest first, like the original list
+        with self.lock:
+            msgs = [dict(m) for m in self.messages[-limit:]]
+        if not with_audio:
+            for m in msgs: m.pop('audio', None)
+        return msgs
+
+    def get_clip(self, msg_id):
+        with self.lock:
+            for m in self.messages:
+                if m['id'] == msg_id: return dict(m)
+        return None
+
+
+# --- 2. SQLITE (WAL) BACKEND ---
+class SQLiteBackend:
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder): os.makedirs(folder, exist_ok=True)
+        self.local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS fleet (callsign TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "sender TEXT, recipient TEXT, time TEXT, audio BLOB, meta TEXT)")
+            # Databases created before clip metadata existed
+            if 'meta' not in [r[1] for r in conn.execute("PRAGMA table_info(messages)")]:
+                conn.execute("ALTER TABLE messages ADD COLUMN meta TEXT")
+
+    def _conn(self):
+        # One connection per thread; every write commits before returning so the writer's
+        # next read (and every other worker's) already sees it
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put_positions(self, positions):
+        rows = [(k, json.dumps(v)) for k, v in positions.items()]
+        self._write(lambda c: c.executemany("INSERT OR REPLACE INTO fleet VALUES (?, ?)", rows))
+
+    def remove_positions(self, callsigns):
+        rows = [(c,) for c in callsigns]
+        self._write(lambda c: c.executemany("DELETE FROM fleet WHERE callsign = ?", rows))
+
+    def get_fleet(self):
+        return {k: json.loads(v) for k, v in self._conn().execute("SELECT callsign, data FROM fleet")}
+
+    def add_messages(self, messages):
+        def insert(c):
+            ids = []
+            for m in messages:
+                meta = {k: v for k, v in m.items() if k not in ('id', 'from', 'to', 'time', 'audio')}
+                cur = c.execute("INSERT INTO messages (sender, recipient, time, audio, meta) VALUES (?, ?, ?, ?, ?)",
+                                (m['from'], m['to'], m['time'], m['audio'], json.dumps(meta)))
+                ids.append(cur.lastrowid)
+            c.execute("DELETE FROM messages WHERE id <= (SELECT MAX(id) FROM messages) - ?", (MAX_MESSAGES,))
+            return ids
+        return self._write(insert)
+
+    def _row_to_msg(self, row):
+        i, f, t, tm, meta, audio = row
+        msg = dict(json.loads(meta or "{}"), id=i)
+        msg.update({'from': f, 'to': t, 'time': tm})
+        if audio is not None: msg['audio'] = bytes(audio)
+        return msg
+
+    def get_messages(self, limit=MAX_MESSAGES, with_audio=True):
+        # Skipping the blobs keeps listing/polling cheap when clips are streamed separately
+        audio = "audio" if with_audio else "NULL"
+        rows = self._conn().execute(
+            f"SELECT id, sender, recipient, time, meta, {audio} FROM messages ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_msg(r) for r in reversed(rows)]
+
+    def get_clip(self, msg_id):
+        row = self._conn().execute(
+            "SELECT id, sender, recipient, time, meta, audio FROM messages WHERE id = ?", (msg_id,)).fetchone()
+        return self._row_to_msg(row) if row else None
+
+
+# --- 3. LOCAL KEY-VALUE SERVER (stand-in for Redis & co.) ---
+def _encode_msgs(messages):
+    return [dict(m, audio=base64.b64encode(m['audio']).decode()) if 'audio' in m else m for m in messages]
+
+def _decode_msgs(messages):
+    return [dict(m, audio=base64.b64decode(m['audio'])) if 'audio' in m else m for m in messages]
+
+
+class KVClientBackend:
+    def __init__(self, host="localhost", port=KV_PORT):
+        self.url = f"http://{host}:{port}"
+
+    def _call(self, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.url + path, data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=10) as r:
+            return json.loads(r.read())
+
+    def put_positions(self, positions): self._call("/fleet/put", positions)
+    def remove_positions(self, callsigns): self._call("/fleet/remove", list(callsigns))
+    def get_fleet(self): return self._call("/fleet")
+    def add_messages(self, messages): return self._call("/messages/add", _encode_msgs(messages))
+    def get_messages(self, limit=MAX_MESSAGES, with_audio=True):
+        return _decode_msgs(self._call(f"/messages?limit={int(limit)}&audio={int(with_audio)}"))
+
+    def get_clip(self, msg_id):
+        found = _decode_msgs(self._call(f"/clip?id={int(msg_id)}"))
+        return found[0] if found else None
+
+
+def serve_kv(port=KV_PORT):
+    store = MemoryBackend()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, obj):
+            body = json.dumps(obj).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            args = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/fleet":
+                self._reply(store.get_fleet())
+            elif url.path == "/messages":
+                limit = int(args.get('limit', MAX_MESSAGES))
+                self._reply(_encode_msgs(store.get_messages(limit, args.get('audio', '1') == '1')))
+            elif url.path == "/clip":
+                clip = store.get_clip(int(args.get('id', 0)))
+                self._reply(_encode_msgs([clip] if clip else []))
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            if self.path == "/fleet/put":
+                store.put_positions(payload); self._reply(True)
+            elif self.path == "/fleet/remove":
+                store.remove_positions(payload); self._reply(True)
+            elif self.path == "/messages/add":
+                self._reply(store.add_messages(_decode_msgs(payload)))
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        # Many workers connect at once; the default backlog of 5 resets connections
+        request_queue_size = 128
+
+    server = Server(('localhost', port), Handler)
+    print(f"📡 Shared state server on port {port}")
+    server.serve_forever()
+
+
+# --- 4. FACTORY ---
+def open_backend(spec=None):
+    spec = spec or os.environ.get("CHARTPLOTTER_STATE", DEFAULT_BACKEND)
+    kind, _, arg = spec.partition(":")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(arg or "data/shared_state.db")
+    if kind == "kv":
+        host, _, port = arg.partition(":")
+        return KVClientBackend(host or "localhost", int(port or KV_PORT))
+    raise ValueError(f"Unknown shared state backend: {spec}")
+
+
+# --- 5. STRESS TEST ---
+def _client(spec, client_id, rounds, results):
+    # One simulated boat: moves, talks, and checks it can always read back its own writes
+    backend = open_backend(spec)
+    name = f"Boat{client_id}"
+    try:
+        errors = _client_rounds(backend, name, rounds)
+    except Exception as e:
+        print(f"  {name} crashed: {e}")
+        errors = rounds
+    results.put((client_id, errors))
+
+
+def _client_rounds(backend, name, rounds):
+    errors = 0
+    for i in range(rounds):
+        backend.put_positions({name: {"lat": 29.5 + i * 1e-4, "lon": -94.9, "last_seen": time.time(),
+                                      "privacy": "Public", "allowed": []}})
+        if backend.get_fleet().get(name, {}).get("lat") != 29.5 + i * 1e-4: errors += 1
+        if i % 5 == 0:
+            new_id = backend.add_messages([{"from": name, "to": "All", "time": "12:00", "audio": os.urandom(64)}])[0]
+            # Other boats may have pushed it out of the short history already, but never "not yet written"
+            latest = backend.get_messages(1)
+            if not latest or latest[-1]['id'] < new_id: errors += 1
+    return errors
+
+
+def stress_test(spec, clients=32, rounds=50):
+    import multiprocessing as mp
+    results = mp.Queue()
+    start = time.time()
+    procs = [mp.Process(target=_client, args=(spec, c, rounds, results)) for c in range(clients)]
+    for p in procs: p.start()
+    errors = sum(results.get()[1] for _ in procs)
+    for p in procs: p.join()
+    elapsed = time.time() - start
+
+    fleet = open_backend(spec).get_fleet()
+    ops = clients * rounds * 2
+    print(f"{spec}: {clients} clients x {rounds} rounds in {elapsed:.2f}s ({ops / elapsed:.0f} ops/s)")
+    print(f"  boats visible: {len(fleet)}/{clients} | read-your-writes misses: {errors}")
+    return len(fleet) == clients and errors == 0
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_kv(int(sys.argv[2]) if len(sys.argv) > 2 else KV_PORT)
+    else:
+        # python shared_state.py [clients] -> stress both cross-process backends
+        clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+        ok = stress_test("sqlite:" + os.path.join(tempfile.mkdtemp(), "stress.db"), clients)
+        threading.Thread(target=serve_kv, args=(KV_PORT + 1,), daemon=True).start()
+        time.sleep(0.5)
+        ok = stress_test(f"kv:localhost:{KV_PORT + 1}", clients) and ok
+        print("✅ Shared state OK" if ok else "❌ Shared state FAILED")
+        sys.exit(0 if ok else 1)
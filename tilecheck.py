@@ -0,0 +1,168 @@
+import io
+import os
+import re
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import downloader
+import downloader_high_res
+from downloader import deg2num, bbox
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# --- CONFIGURATION ---
+TILE_DIR = "static/tiles"
+# Which downloader owns each zoom: paper charts where downloader.py fetches them, satellite
+# (downloader_high_res.py) above that, where the chart server only has gray "Not Available" tiles
+TILE_SOURCES = {z: {'url': downloader_high_res.TILE_URL, 'headers': downloader_high_res.HEADERS}
+                for z in downloader_high_res.ZOOM_LEVELS}
+TILE_SOURCES.update({z: {'url': downloader.TILE_URL, 'headers': {}} for z in downloader.ZOOM_LEVELS})
+ZOOM_LEVELS = sorted(TILE_SOURCES)
+REPAIR_MANIFEST = "data/repair_manifest.json"
+# The same bytes this many times + no colour = server placeholder ("Map data not yet available", gray
+# tiles). Repeated *coloured* tiles are real (open water, land) and are left alone.
+DUPLICATE_LIMIT = 20
+GRAY_SPREAD = 8           # Max R/G/B difference for a pixel to count as gray
+CHUNK = 500               # Files per worker task
+TILE_NAME = re.compile(r"^(\d+)/(\d+)/(\d+)\.png$")
+
+PNG_SIG = b"\x89PNG\r\n\x1a\n"
+
+
+# --- 1. PER-TILE CHECKS (run in worker processes) ---
+def _check_png(data):
+    # Walk every chunk, verify CRCs and inflate the image data (a real decode of the byte stream)
+    pos, idat, width, height = 8, [], 0, 0
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        crc = data[pos + 8 + length:pos + 12 + length]
+        if len(body) < length or len(crc) < 4: return "truncated"
+        if zlib.crc32(kind + body) != struct.unpack(">I", crc)[0]: return "corrupt"
+        if kind == b"IHDR": width, height = struct.unpack(">II", body[:8])
+        elif kind == b"IDAT": idat.append(body)
+        elif kind == b"IEND":
+            try:
+                raw = zlib.decompress(b"".join(idat))
+            except zlib.error:
+                return "corrupt"
+            return "ok" if width and height and len(raw) >= height else "corrupt"
+        pos += 12 + length
+    return "truncated"
+
+def _check_jpeg(data):
+    # ArcGIS imagery is JPEG even when saved as .png; a complete file ends with the EOI marker
+    return "ok" if data.rstrip(b"\x00").endswith(b"\xff\xd9") else "truncated"
+
+def check_tile(path):
+    # -> (status, sha1, gray). status: ok | empty | truncated | corrupt | blank | unknown
+    # gray: True/False when Pillow could look at the pixels, None otherwise
+    with open(path, "rb") as f: data = f.read()
+    if not data: return "empty", None, None
+    digest = hashlib.sha1(data).hexdigest()
+    if data.startswith(PNG_SIG): status = _check_png(data)
+    elif data.startswith(b"\xff\xd8"): status = _check_jpeg(data)
+    else: return "unknown", digest, None
+
+    # Full decode + colour check when Pillow is around
+    gray = None
+    if status == "ok" and Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.load()
+                px = np.asarray(img.convert("RGB"), dtype=np.int16)
+        except Exception:
+            return "corrupt", digest, None
+        gray = bool((px.max(axis=2) - px.min(axis=2)).max() <= GRAY_SPREAD)
+        # A single flat gray/white/black tile is an error image, a flat blue one is just sea
+        if gray and (px == px[0, 0]).all(): status = "blank"
+    return status, digest, gray
+
+def _check_batch(paths):
+    out = []
+    for rel, path in paths:
+        try:
+            status, digest, gray = check_tile(path)
+        except OSError:
+            status, digest, gray = "unreadable", None, None
+        out.append((rel, status, digest, gray))
+    return out
+
+
+# --- 2. STORE SCAN ---
+def expected_tiles(zooms=ZOOM_LEVELS, area=bbox):
+    # Same tile ranges the downloaders walk
+    for z in zooms:
+        x_min, y_max = deg2num(area[0], area[1], z)
+        x_max, y_min = deg2num(area[2], area[3], z)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                yield f"{z}/{x}/{y}.png"
+
+def stored_zooms(tile_dir=TILE_DIR):
+    # Zooms that were actually downloaded: a chart-only store is not "missing" its satellite zooms
+    return [z for z in ZOOM_LEVELS if os.path.isdir(os.path.join(tile_dir, str(z)))]
+
+def verify(tile_dir=TILE_DIR, zooms=None, workers=None):
+    zooms = stored_zooms(tile_dir) if zooms is None else zooms
+    files = []
+    for root, _, names in os.walk(tile_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, tile_dir).replace(os.sep, "/")
+            if TILE_NAME.match(rel): files.append((rel, path))
+
+    batches = [files[i:i + CHUNK] for i in range(0, len(files), CHUNK)]
+    with ProcessPoolExecutor(workers) as pool:
+        results = [r for batch in pool.map(_check_batch, batches) for r in batch]
+
+    counts = Counter(d for _, status, d, gray in results if status == "ok" and gray is not False)
+    placeholders = {d for d, n in counts.items() if n >= DUPLICATE_LIMIT}
+
+    problems = {}
+    for rel, status, digest, _ in results:
+        if status != "ok": problems[rel] = status
+        elif digest in placeholders: problems[rel] = "placeholder"
+
+    present = {rel for rel, _ in files}
+    for rel in expected_tiles(zooms):
+        if rel not in present: problems[rel] = "missing"
+
+    return {'checked': len(files), 'zooms': zooms, 'problems': problems,
+            'duplicate_hashes': {d: counts[d] for d in placeholders}}
+
+def write_repair_manifest(report, path=REPAIR_MANIFEST):
+    # {'sources': {z: {'url', 'headers'}}, 'tiles': [[z, x, y, reason], ...]}
+    # consumed by `python downloader.py --repair <path>`, which fetches each tile from its zoom's source
+    tiles = sorted((*map(int, TILE_NAME.match(rel).groups()), reason) for rel, reason in report['problems'].items())
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder): os.makedirs(folder)
+    with open(path, "w") as f:
+        json.dump({'sources': {z: TILE_SOURCES[z] for z in sorted({t[0] for t in tiles}) if z in TILE_SOURCES},
+                   'tiles': [list(t) for t in tiles]}, f)
+    return len(tiles)
+
+
+if __name__ == "__main__":
+    # python tilecheck.py verify [zoom list, e.g. 11,12,13]   (default: every zoom present in the store)
+    args = [a for a in sys.argv[1:] if a != "verify"]
+    zooms = [int(z) for z in args[0].split(",")] if args else stored_zooms()
+    print(f"🔍 Verifying {TILE_DIR} (zooms {zooms})...")
+    report = verify(zooms=zooms)
+    by_reason = Counter(report['problems'].values())
+    print(f"Checked {report['checked']} tiles.")
+    for reason, n in sorted(by_reason.items()):
+        print(f"  {reason}: {n}")
+    n = write_repair_manifest(report)
+    if n:
+        print(f"🛠️ {n} tiles queued in {REPAIR_MANIFEST} -> run: python downloader.py --repair {REPAIR_MANIFEST}")
+    else:
+        print("✅ Tile store is healthy.")
@@ -0,0 +1,313 @@
+import os
+import io
+import re
+import sys
+import json
+import hmac
+import tarfile
+import hashlib
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# --- CONFIGURATION ---
+TILE_DIR = "static/tiles"
+STATIC_DIR = "static"     # The only folder served over HTTP (never the project root: secrets, shared_state.db)
+# Shared secret for /sync/*, sent as X-Sync-Token. Sync is refused while it is unset.
+SYNC_TOKEN = os.environ.get("TILE_SYNC_TOKEN", "")
+MANIFEST_CACHE = "data/cache/tile_manifest.json"
+BATCH_SIZE = 200          # Tiles per tar archive
+WORKERS = 4               # Archives in flight at once
+TILE_NAME = re.compile(r"^(\d+)/(\d+)/(\d+)\.png$")
+
+
+# --- 1. MANIFEST (Merkle tree: root -> zoom -> column -> tile) ---
+_cache_lock = threading.Lock()
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+def _tree_hash(children):
+    return _sha1("\n".join(f"{k}:{children[k]}" for k in sorted(children, key=int)).encode())
+
+def tile_hashes(tile_dir=TILE_DIR, cache_file=MANIFEST_CACHE):
+    # {'z/x/y.png': sha1} - only re-hashes files whose size/mtime changed since the last run
+    with _cache_lock:
+        try:
+            with open(cache_file) as f: cache = json.load(f).get(os.path.abspath(tile_dir), {})
+        except (OSError, ValueError):
+            cache = {}
+
+        hashes, fresh = {}, {}
+        for root, _, files in os.walk(tile_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, tile_dir).replace(os.sep, "/")
+                if not TILE_NAME.match(rel): continue
+                st = os.stat(path)
+                stamp = f"{st.st_size}:{st.st_mtime_ns}"
+                cached = cache.get(rel)
+                if cached and cached[0] == stamp:
+                    digest = cached[1]
+                else:
+                    with open(path, "rb") as f: digest = _sha1(f.read())
+                hashes[rel] = digest
+                fresh[rel] = [stamp, digest]
+
+        folder = os.path.dirname(cache_file)
+        if folder and not os.path.exists(folder): os.makedirs(folder)
+        try:
+            with open(cache_file) as f: all_caches = json.load(f)
+        except (OSError, ValueError):
+            all_caches = {}
+        all_caches[os.path.abspath(tile_dir)] = fresh
+        with open(cache_file, "w") as f: json.dump(all_caches, f)
+        return hashes
+
+def _store_stamp(tile_dir):
+    # Digest of every tile's path, size and mtime - the same stat tile_hashes keys on, so a tile
+    # rewritten in place (downloader_high_res, generate_charts) is seen as well as new / removed ones
+    stamp = hashlib.sha1()
+    for root, _, files in os.walk(tile_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, tile_dir).replace(os.sep, "/")
+            if not TILE_NAME.match(rel): continue
+            st = os.stat(path)
+            stamp.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return stamp.hexdigest()
+
+_manifests = {}           # abs tile dir -> (store stamp, manifest)
+_manifest_lock = threading.Lock()
+
+def cached_manifest(tile_dir=TILE_DIR):
+    # One stat walk per request, but only one hash pass per change of the store: a diff asks for Z+2 levels
+    key, stamp = os.path.abspath(tile_dir), _store_stamp(tile_dir)
+    with _manifest_lock:
+        hit = _manifests.get(key)
+        if hit and hit[0] == stamp: return hit[1]
+        manifest = build_manifest(tile_hashes(tile_dir))
+        _manifests[key] = (stamp, manifest)
+        return manifest
+
+def build_manifest(hashes):
+    # {'root': h, 'zooms': {z: h}, 'columns': {z: {x: h}}, 'tiles': {z: {x: {y: h}}}}
+    tiles = {}
+    for rel, digest in hashes.items():
+        z, x, y = TILE_NAME.match(rel).groups()
+        tiles.setdefault(z, {}).setdefault(x, {})[y] = digest
+    columns = {z: {x: _tree_hash(ys) for x, ys in xs.items()} for z, xs in tiles.items()}
+    zooms = {z: _tree_hash(xs) for z, xs in columns.items()}
+    return {'root': _tree_hash(zooms), 'zooms': zooms, 'columns': columns, 'tiles': tiles}
+
+
+# --- 2. HTTP ENDPOINTS (mixed into the tile server) ---
+class TileSyncHandler(SimpleHTTPRequestHandler):
+    # Serves /static/... from STATIC_DIR only, plus (with a valid X-Sync-Token):
+    #   GET  /sync/manifest            -> root + per-zoom hashes
+    #   GET  /sync/manifest/<z>        -> per-column hashes for one zoom
+    #   POST /sync/columns  ["z/x"]    -> per-tile hashes for those columns
+    #   POST /sync/fetch    ["z/x/y.png"] -> tar archive of those tiles
+    #   POST /sync/upload   <tar>      -> stores tiles, replies with their sha1 as written
+    tile_dir = TILE_DIR
+    static_dir = STATIC_DIR
+    token = SYNC_TOKEN
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=self.static_dir, **kwargs)
+
+    def _authorized(self):
+        sent = self.headers.get("X-Sync-Token", "")
+        if self.token and hmac.compare_digest(sent.encode(), self.token.encode()): return True
+        self.send_error(403, "Tile sync needs a matching TILE_SYNC_TOKEN")
+        return False
+
+    def _static(self, send):
+        # Keeps the /static/tiles/... URLs the map uses, but nothing outside STATIC_DIR is reachable
+        if not self.path.startswith("/static/"):
+            self.send_error(404)
+            return
+        self.path = self.path[len("/static"):]
+        send()
+
+    def do_HEAD(self):
+        self._static(super().do_HEAD)
+
+    def _json(self, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if not self.path.startswith("/sync/"):
+            return self._static(super().do_GET)
+        if not self._authorized(): return
+        manifest = cached_manifest(self.tile_dir)
+        parts = self.path.strip("/").split("/")
+        if parts == ["sync", "manifest"]:
+            self._json({'root': manifest['root'], 'zooms': manifest['zooms']})
+        elif len(parts) == 3 and parts[:2] == ["sync", "manifest"]:
+            self._json(manifest['columns'].get(parts[2], {}))
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self._authorized(): return
+        if self.path == "/sync/columns":
+            tiles = cached_manifest(self.tile_dir)['tiles']
+            wanted = json.loads(self._body())
+            self._json({c: tiles.get(c.split("/")[0], {}).get(c.split("/")[1], {}) for c in wanted})
+        elif self.path == "/sync/fetch":
+            names = [n for n in json.loads(self._body()) if TILE_NAME.match(n)]
+            body = pack_tiles(self.tile_dir, names)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-tar")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/sync/upload":
+            self._json(unpack_tiles(self.tile_dir, self._body()))
+        else:
+            self.send_error(404)
+
+
+# --- 3. ARCHIVES ---
+def pack_tiles(tile_dir, names):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name in names:
+            path = os.path.join(tile_dir, name)
+            if os.path.exists(path): tar.add(path, arcname=name)
+    return buf.getvalue()
+
+def unpack_tiles(tile_dir, archive):
+    # Only plain z/x/y.png members are accepted; each tile is written atomically
+    written = {}
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r") as tar:
+        for member in tar.getmembers():
+            if not member.isfile() or not TILE_NAME.match(member.name): continue
+            data = tar.extractfile(member).read()
+            path = os.path.join(tile_dir, *member.name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".part"
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+            written[member.name] = _sha1(data)
+    return written
+
+
+# --- 4. SYNC CLIENT ---
+def _get(url):
+    req = urllib.request.Request(url, headers={"X-Sync-Token": SYNC_TOKEN})
+    with urllib.request.urlopen(req, timeout=60) as r: return r.read()
+
+def _post(url, body, content_type="application/json"):
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type, "X-Sync-Token": SYNC_TOKEN})
+    with urllib.request.urlopen(req, timeout=300) as r: return r.read()
+
+def diff_with_peer(peer, local):
+    # Walk the Merkle tree top-down, only descending where hashes differ.
+    # Returns (only_local, only_remote, different) as {'z/x/y.png': sha1} dicts
+    # (local hashes for only_local, the peer's hashes for the other two).
+    remote = json.loads(_get(f"{peer}/sync/manifest"))
+    if remote['root'] == local['root']: return {}, {}, {}
+
+    changed_cols = []
+    for z in set(local['zooms']) | set(remote['zooms']):
+        if local['zooms'].get(z) == remote['zooms'].get(z): continue
+        remote_cols = json.loads(_get(f"{peer}/sync/manifest/{z}")) if z in remote['zooms'] else {}
+        for x in set(local['columns'].get(z, {})) | set(remote_cols):
+            if local['columns'].get(z, {}).get(x) != remote_cols.get(x):
+                changed_cols.append(f"{z}/{x}")
+
+    remote_tiles = json.loads(_post(f"{peer}/sync/columns", json.dumps(changed_cols).encode())) if changed_cols else {}
+    only_local, only_remote, different = {}, {}, {}
+    for col in changed_cols:
+        z, x = col.split("/")
+        mine = local['tiles'].get(z, {}).get(x, {})
+        other = remote_tiles.get(col, {})
+        for y in set(mine) | set(other):
+            name = f"{z}/{x}/{y}.png"
+            if y not in other: only_local[name] = mine[y]
+            elif y not in mine: only_remote[name] = other[y]
+            elif mine[y] != other[y]: different[name] = other[y]
+    return only_local, only_remote, different
+
+def _batches(names):
+    names = sorted(names)
+    return [names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE)]
+
+def push(peer, tile_dir=TILE_DIR):
+    local = cached_manifest(tile_dir)
+    hashes = {f"{z}/{x}/{y}.png": h for z, xs in local['tiles'].items() for x, ys in xs.items() for y, h in ys.items()}
+    only_local, _, different = diff_with_peer(peer, local)
+    send = {n: hashes[n] for n in list(only_local) + list(different)}
+    print(f"📦 Sending {len(send)} of {len(hashes)} tiles in {len(_batches(send))} archives...")
+
+    def upload(batch):
+        written = json.loads(_post(f"{peer}/sync/upload", pack_tiles(tile_dir, batch), "application/x-tar"))
+        return [n for n in batch if written.get(n) != send[n]]
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        bad = [n for failed in pool.map(upload, _batches(send)) for n in failed]
+    return verify(peer, tile_dir, bad, pushing=True)
+
+def pull(peer, tile_dir=TILE_DIR):
+    local = cached_manifest(tile_dir)
+    _, only_remote, different = diff_with_peer(peer, local)
+    want = dict(only_remote, **different)
+    print(f"📦 Fetching {len(want)} tiles in {len(_batches(want))} archives...")
+
+    def fetch(batch):
+        written = unpack_tiles(tile_dir, _post(f"{peer}/sync/fetch", json.dumps(batch).encode()))
+        return [n for n in batch if written.get(n) != want[n]]
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        bad = [n for failed in pool.map(fetch, _batches(want)) for n in failed]
+    return verify(peer, tile_dir, bad, pushing=False)
+
+def verify(peer, tile_dir, bad, pushing):
+    # Every tile's sha1 was checked as its archive landed; finish with a fresh Merkle comparison
+    for name in bad[:10]: print(f"  ❌ Checksum mismatch: {name}")
+    only_local, only_remote, different = diff_with_peer(peer, cached_manifest(tile_dir))
+    left = len(different) + (len(only_local) if pushing else len(only_remote))
+    if not bad and left == 0:
+        print("✅ Sync verified, every tile matches.")
+        return True
+    print(f"⚠️ {len(bad)} bad tiles, {left} tiles still differ")
+    return False
+
+
+# --- 5. CLI ---
+def serve(port=8000, host="localhost", tile_dir=TILE_DIR):
+    # Standalone sync peer (e.g. on the shore machine). Pass a host (0.0.0.0) to accept other machines.
+    if not SYNC_TOKEN: print("⚠️ TILE_SYNC_TOKEN is not set, sync requests will be refused")
+    handler = type("Handler", (TileSyncHandler,), {'tile_dir': tile_dir})
+    print(f"🚀 Tile sync server on {host}:{port} ({tile_dir})")
+    ThreadingHTTPServer((host, port), handler).serve_forever()
+
+if __name__ == "__main__":
+    # python tilesync.py push http://boat-tablet:8000
+    # python tilesync.py pull http://shore-pc:8000
+    # python tilesync.py serve [port] [host]
+    # Both sides need the same TILE_SYNC_TOKEN in the environment
+    # python tilesync.py manifest
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "manifest"
+    if cmd == "push": ok = push(sys.argv[2].rstrip("/"))
+    elif cmd == "pull": ok = pull(sys.argv[2].rstrip("/"))
+    elif cmd == "serve":
+        ok = serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8000, sys.argv[3] if len(sys.argv) > 3 else "localhost")
+    else:
+        m = cached_manifest()
+        print(f"Root {m['root']}")
+        for z in sorted(m['zooms'], key=int):
+            print(f"  Zoom {z}: {sum(len(ys) for ys in m['tiles'][z].values())} tiles, {m['zooms'][z][:12]}")
+        ok = True
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,306 @@
+import io
+import os
+import re
+import csv
+import sys
+import json
+import calendar
+from functools import reduce
+from operator import xor
+import numpy as np
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# --- CONFIGURATION ---
+TRACK_STORE = "data/tracks"
+CHUNK_SIZE = 100_000        # Points per processing chunk (bounds memory)
+MOVING_SOG = 0.5            # Below this (kts) the boat counts as stopped
+MAX_SOG = 80                # Faster than this between fixes = GPS glitch, ignored for stats
+DISPLAY_POINTS = 5000       # Upper bound for the decimated map version
+EARTH_RADIUS_NM = 3440.065
+
+
+# --- 1. PARSERS (generators of (epoch_seconds or nan, lat, lon)) ---
+def iter_gpx(f):
+    # Only <trkpt> are logged fixes. Waypoints (POIs) are skipped; route points (a plan) are kept
+    # aside and only used when the file has no track at all.
+    # iterparse keeps memory flat only if finished points are detached from their parent:
+    # clear() alone leaves an empty element behind per point until the whole <trkseg> ends
+    point, stack, route, tracked = None, [], [], False
+    for event, el in ET.iterparse(f, events=("start", "end")):
+        if event == "start":
+            stack.append(el)
+            if el.tag.rsplit("}", 1)[-1] in ("trkpt", "rtept", "wpt"):
+                point = [float("nan"), float(el.get("lat")), float(el.get("lon"))]
+            continue
+        stack.pop()
+        tag = el.tag.rsplit("}", 1)[-1]
+        if tag == "time" and point is not None and el.text:
+            point[0] = _parse_time(el.text)
+        elif tag == "trkpt":
+            tracked = True
+            yield tuple(point)
+            point = None
+        elif tag == "rtept":
+            if not tracked: route.append(tuple(point))
+            point = None
+        elif tag == "wpt":
+            point = None
+        else:
+            continue
+        # Parent's last child is `el`, so removing it is O(1)
+        if stack: stack[-1].remove(el)
+    if not tracked: yield from route
+
+def _nmea_coord(value, hemi):
+    if not value: return None
+    dot = value.index(".") if "." in value else len(value)
+    deg = float(value[:dot - 2]) + float(value[dot - 2:]) / 60
+    return -deg if hemi in ("S", "W") else deg
+
+def _nmea_ok(line):
+    if "*" not in line: return True
+    body, _, check = line[1:].partition("*")
+    try:
+        return reduce(xor, body.encode(), 0) == int(check[:2], 16)
+    except ValueError:
+        return False
+
+def iter_nmea(f):
+    # RMC carries date + time + position; GGA only time, so it borrows the last RMC date
+    date, day_start = None, None
+    for line in f:
+        line = line.strip()
+        if len(line) < 7 or line[0] != "$" or not _nmea_ok(line): continue
+        kind = line[3:6]
+        fields = line.split("*")[0].split(",")
+        try:
+            if kind == "RMC" and len(fields) > 9 and fields[2] == "A":
+                if fields[9] != date:
+                    date = fields[9]
+                    day_start = calendar.timegm((2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]), 0, 0, 0))
+                lat, lon = _nmea_coord(fields[3], fields[4]), _nmea_coord(fields[5], fields[6])
+                stamp = fields[1]
+            elif kind == "GGA" and len(fields) > 6 and fields[6] not in ("", "0"):
+                lat, lon = _nmea_coord(fields[2], fields[3]), _nmea_coord(fields[4], fields[5])
+                stamp = fields[1]
+            else:
+                continue
+        except ValueError:
+            continue
+        if lat is None or lon is None: continue
+        t = float("nan")
+        if day_start is not None and len(stamp) >= 6:
+            t = day_start + int(stamp[0:2]) * 3600 + int(stamp[2:4]) * 60 + float(stamp[4:])
+        yield (t, lat, lon)
+
+def iter_csv(f):
+    reader = csv.reader(f)
+    header = [h.strip().lower() for h in next(reader, [])]
+
+    def find(*names):
+        for n in names:
+            if n in header: return header.index(n)
+        return None
+
+    ilat, ilon = find("lat", "latitude"), find("lon", "lng", "long", "longitude")
+    itime = find("time", "timestamp", "datetime", "date")
+    if ilat is None or ilon is None:
+        # The app's own export: index, lat, lon
+        ilat, ilon = (find("0"), find("1")) if find("0") is not None else (0, 1)
+    for row in reader:
+        try:
+            t = _parse_time(row[itime]) if itime is not None else float("nan")
+            yield (t, float(row[ilat]), float(row[ilon]))
+        except (ValueError, IndexError):
+            continue
+
+def _parse_time(text):
+    text = text.strip()
+    if re.fullmatch(r"\d+(\.\d+)?", text): return float(text)
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return float("nan")
+    return dt.timestamp() if dt.tzinfo else calendar.timegm(dt.timetuple()) + dt.microsecond / 1e6
+
+def detect_format(name, head):
+    name = name.lower()
+    if name.endswith(".gpx") or b"<gpx" in head: return "gpx"
+    if name.endswith((".nmea", ".nma", ".log", ".txt")) or head.lstrip().startswith(b"$"): return "nmea"
+    return "csv"
+
+def iter_points(f, name=""):
+    # f: binary file object. Picks the parser from the name / first bytes.
+    head = f.read(512)
+    f.seek(0)
+    kind = detect_format(name, head)
+    if kind == "gpx": return iter_gpx(f)
+    text = io.TextIOWrapper(f, encoding="utf-8", errors="replace", newline="")
+    return iter_nmea(text) if kind == "nmea" else iter_csv(text)
+
+def iter_chunks(points, size=CHUNK_SIZE):
+    # Generator of (n, 3) float arrays [t, lat, lon]
+    buf = []
+    for p in points:
+        buf.append(p)
+        if len(buf) == size:
+            yield np.array(buf, dtype=float)
+            buf = []
+    if buf: yield np.array(buf, dtype=float)
+
+
+# --- 2. ONE-PASS STATS & DECIMATION ---
+class TrackStats:
+    def __init__(self):
+        self.points = 0
+        self.distance_nm = 0.0
+        self.moving_hours = 0.0
+        self.moving_nm = 0.0
+        self.max_sog = 0.0
+        self.start = None
+        self.end = None
+        self.last = None
+
+    def add(self, chunk):
+        # Chunks are stitched with the last point of the previous one so no leg is lost
+        pts = chunk if self.last is None else np.vstack([self.last, chunk])
+        self.points += len(chunk)
+        self.last = chunk[-1:]
+        times = chunk[:, 0][~np.isnan(chunk[:, 0])]
+        if len(times):
+            self.start = times[0] if self.start is None else self.start
+            self.end = times[-1]
+        if len(pts) < 2: return
+
+        p1, p2 = np.radians(pts[:-1, 1]), np.radians(pts[1:, 1])
+        dl = np.radians(pts[1:, 2] - pts[:-1, 2])
+        a = np.sin((p2 - p1) / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+        nm = 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        hours = np.diff(pts[:, 0]) / 3600
+
+        timed = hours > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sog = np.where(timed, nm / hours, np.nan)
+        glitch = timed & (sog > MAX_SOG)
+        self.distance_nm += nm[~glitch].sum()
+        moving = timed & ~glitch & (sog >= MOVING_SOG)
+        self.moving_hours += hours[moving].sum()
+        self.moving_nm += nm[moving].sum()
+        if moving.any(): self.max_sog = max(self.max_sog, float(sog[moving].max()))
+
+    def summary(self):
+        return {
+            'points': self.points,
+            'distance_nm': round(float(self.distance_nm), 2),
+            'moving_hours': round(float(self.moving_hours), 3),
+            'avg_sog': round(float(self.moving_nm / self.moving_hours), 2) if self.moving_hours else None,
+            'max_sog': round(self.max_sog, 2),
+            'start': None if self.start is None else float(self.start),
+            'end': None if self.end is None else float(self.end),
+        }
+
+
+class Decimator:
+    # Streaming along-track thinning with a hard cap: a point is kept each time the distance
+    # sailed crosses another `spacing` step. When the kept set overflows, the spacing doubles and
+    # the kept points are thinned the same way (memory stays O(DISPLAY_POINTS)).
+    def __init__(self, max_points=DISPLAY_POINTS, spacing_nm=0.005):
+        self.max_points = max_points
+        self.spacing = spacing_nm
+        self.kept = np.zeros((0, 3))
+        self.last = None
+        self.travelled = 0.0    # Along-track nm since the last kept point
+
+    @staticmethod
+    def _steps(pts):
+        dx = np.diff(pts[:, 2]) * 60 * np.cos(np.radians(pts[1:, 1]))
+        return np.hypot(dx, np.diff(pts[:, 1]) * 60)
+
+    def _thin(self, pts, start):
+        cum = start + np.cumsum(self._steps(pts))
+        bins = np.floor(cum / self.spacing)
+        keep = np.diff(np.concatenate([[0.0], bins])) > 0
+        if not len(cum): return pts[:0], start
+        # Returns the kept points + distance travelled since the last one
+        return pts[1:][keep], cum[-1] - (cum[keep][-1] if keep.any() else 0.0)
+
+    def add(self, chunk):
+        if self.last is None:
+            self.kept = chunk[:1].copy()
+            pts = chunk
+        else:
+            pts = np.vstack([self.last, chunk])
+        self.last = chunk[-1:].copy()
+        new, self.travelled = self._thin(pts, self.travelled)
+        self.kept = np.vstack([self.kept, new])
+        while len(self.kept) > self.max_points:
+            self.spacing *= 2
+            new, _ = self._thin(self.kept, 0.0)
+            self.kept = np.vstack([self.kept[:1], new])
+
+    def points(self):
+        # Always finish on the real last fix
+        if self.last is not None and not np.array_equal(self.kept[-1], self.last[0]):
+            return np.vstack([self.kept, self.last])
+        return self.kept
+
+
+# --- 3. TRACK STORE ---
+def import_track(f, name, store=TRACK_STORE):
+    # Streams a log into data/tracks/<name>/: full.bin (float64 t, lat, lon rows, appended per chunk),
+    # display.json (decimated [lat, lon]) and stats.json
+    # The id is the file name, with _2, _3... added when a track of that name already exists
+    # (trip.gpx twice, or trip.nmea next to trip.gpx) so an import never overwrites another
+    base = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(os.path.basename(name))[0]) or "track"
+    os.makedirs(store, exist_ok=True)
+    track_id, n = base, 1
+    while True:
+        folder = os.path.join(store, track_id)
+        try:
+            os.makedirs(folder)
+            break
+        except FileExistsError:
+            n += 1
+            track_id = f"{base}_{n}"
+
+    stats, thin = TrackStats(), Decimator()
+    with open(os.path.join(folder, "full.bin"), "wb") as out:
+        for chunk in iter_chunks(iter_points(f, name)):
+            chunk.tofile(out)
+            stats.add(chunk)
+            thin.add(chunk)
+
+    summary = dict(stats.summary(), id=track_id, source=os.path.basename(name))
+    with open(os.path.join(folder, "display.json"), "w") as out:
+        json.dump(thin.points()[:, 1:].tolist(), out)
+    with open(os.path.join(folder, "stats.json"), "w") as out:
+        json.dump(summary, out)
+    return summary
+
+def list_tracks(store=TRACK_STORE):
+    tracks = []
+    if not os.path.exists(store): return tracks
+    for track_id in sorted(os.listdir(store)):
+        try:
+            with open(os.path.join(store, track_id, "stats.json")) as f: tracks.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return tracks
+
+def load_display(track_id, store=TRACK_STORE):
+    with open(os.path.join(store, track_id, "display.json")) as f:
+        return [tuple(p) for p in json.load(f)]
+
+def load_full(track_id, store=TRACK_STORE):
+    # Memory-mapped full-resolution points, (n, 3) [t, lat, lon]
+    return np.memmap(os.path.join(store, track_id, "full.bin"), dtype=np.float64, mode="r").reshape(-1, 3)
+
+
+if __name__ == "__main__":
+    # python tracklog.py season_2025.nmea [more logs...]
+    for path in sys.argv[1:]:
+        with open(path, "rb") as f:
+            s = import_track(f, path)
+        print(f"✅ {s['id']}: {s['points']} pts, {s['distance_nm']} nm, "
+              f"moving {s['moving_hours']:.1f} h, avg {s['avg_sog']} / max {s['max_sog']} kts")
@@ -0,0 +1,94 @@
+import io
+import wave
+import shutil
+import hashlib
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# --- CONFIGURATION ---
+# Opus in OGG via ffmpeg when it is installed, otherwise 8 kHz / 8-bit mono WAV
+# (~4x smaller than the 16 kHz / 16-bit mono clips st.audio_input records)
+OPUS_BITRATE = "16k"
+FALLBACK_RATE = 8000
+
+FFMPEG = shutil.which("ffmpeg")
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="voice")
+
+
+# --- 1. CODECS ---
+def clip_hash(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+def wav_duration(raw):
+    try:
+        with wave.open(io.BytesIO(raw)) as w:
+            return w.getnframes() / float(w.getframerate())
+    except (wave.Error, EOFError):
+        return 0.0
+
+def _to_opus(raw):
+    cmd = [FFMPEG, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+           "-ac", "1", "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg", "pipe:1"]
+    out = subprocess.run(cmd, input=raw, capture_output=True, timeout=60, check=True).stdout
+    return out, "audio/ogg"
+
+def _to_low_rate_wav(raw):
+    with wave.open(io.BytesIO(raw)) as w:
+        rate, channels, width = w.getframerate(), w.getnchannels(), w.getsampwidth()
+        frames = w.readframes(w.getnframes())
+
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    pcm = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if width == 1: pcm = (pcm - 128) * 256
+    elif width == 4: pcm /= 65536
+    pcm = pcm.reshape(-1, channels).mean(axis=1)
+
+    # Box-filter down to the target rate, then 8-bit unsigned PCM (plays everywhere)
+    step = max(int(round(rate / FALLBACK_RATE)), 1)
+    pcm = pcm[:len(pcm) // step * step].reshape(-1, step).mean(axis=1)
+    out_rate = rate // step
+    pcm8 = np.clip(pcm / 256 + 128, 0, 255).astype(np.uint8)
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(out_rate)
+        w.writeframes(pcm8.tobytes())
+    return buf.getvalue(), "audio/wav"
+
+def transcode(raw):
+    # Raw recorder WAV -> (compact bytes, mime). Falls back gracefully, worst case keeps the original
+    if FFMPEG:
+        try:
+            return _to_opus(raw)
+        except (subprocess.SubprocessError, OSError) as e:
+            print(f"Opus transcode failed, using WAV fallback: {e}")
+    try:
+        return _to_low_rate_wav(raw)
+    except (wave.Error, EOFError, KeyError, ValueError) as e:
+        print(f"WAV fallback failed, storing original clip: {e}")
+        return raw, "audio/wav"
+
+
+# --- 2. BACKGROUND SEND ---
+def _encode_and_store(backend, msg, raw):
+    audio, mime = transcode(raw)
+    backend.add_messages([dict(msg, audio=audio, mime=mime, duration=round(wav_duration(raw), 1),
+                               raw_size=len(raw), size=len(audio))])
+
+def send_clip(backend, msg, raw):
+    # Encode off the Streamlit script thread; the message shows up (and is pushed live) when done
+    return _pool.submit(_encode_and_store, backend, msg, raw)
+
+
+# --- 3. DISPLAY HELPERS ---
+def format_size(n):
+    return f"{n / 1024:.0f} KB" if n >= 1024 else f"{n} B"
+
+def bandwidth_note(msg):
+    raw, size = msg.get('raw_size'), msg.get('size')
+    if not raw or not size: return ""
+    saved = raw - size
+    return f"{msg.get('duration', 0):.1f}s · {format_size(size)} (saved {format_size(saved)}, {saved / raw:.0%})"